@@ -25,6 +25,7 @@ class UserViewSet(
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    query_budget = {'retrieve': 2, 'groups': 3, 'permissions': 2}
 
     @action(
         detail=False,
@@ -34,7 +35,8 @@ class UserViewSet(
         if request.method == 'POST':
             # TODO: set user groups
             return Response({})
-        return Response(GroupSerializer(Group.objects.filter(user=request.user), many=True).data)
+        groups = Group.objects.filter(user=request.user).prefetch_related('permissions')
+        return Response(GroupSerializer(groups, many=True).data)
 
     @action(
         detail=False,
@@ -61,8 +63,9 @@ class GroupViewSet(
     """
     Manage user groups
     """
-    queryset = Group.objects.all()
+    queryset = Group.objects.prefetch_related('permissions').all()
     permission_classes = [IsAdminUser]
+    query_budget = {'list': 3}
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
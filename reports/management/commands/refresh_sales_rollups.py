@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from reports.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Roll up the orders changed since the last refresh into the daily sales reporting tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild the rollups of every day (backfill)')
+
+    def handle(self, *args, **options):
+        days = refresh_rollups(full=options['full'])
+        if days is None:
+            self.stdout.write('Rebuilt the rollups of every day')
+        else:
+            self.stdout.write(f'Refreshed the rollups of {days} days')
@@ -0,0 +1,51 @@
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+
+from shop.models import Brand, Category, Order, Product
+
+
+class DailySales(models.Model):
+    """Units sold and revenue per day, brand, category and currency"""
+    day = models.DateField()
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    currency = models.CharField(max_length=3)
+    units = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        unique_together = [('day', 'brand', 'category', 'currency')]
+
+
+class DailyProductSales(models.Model):
+    """Units sold and revenue per day, product and currency"""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    currency = models.CharField(max_length=3)
+    units = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        unique_together = [('day', 'product', 'currency')]
+
+
+class DailyOrders(models.Model):
+    """Orders placed per day, current status and currency"""
+    day = models.DateField()
+    status = models.CharField(max_length=255, choices=Order.Status.choices)
+    currency = models.CharField(max_length=3)
+    order_count = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        unique_together = [('day', 'status', 'currency')]
+
+
+class RollupState(models.Model):
+    """
+    How far the rollups were refreshed: orders changed since ``refreshed_at``, and the days of the orders deleted
+    since then (``pending_days``), are rolled up next time
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    refreshed_at = models.DateTimeField()
+    pending_days = ArrayField(models.DateField(), default=list, blank=True)
@@ -0,0 +1,113 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Func, Value
+from django.utils import timezone
+
+from shop.models import Order, OrderItem, Product
+from .models import DailySales, DailyProductSales, DailyOrders, RollupState
+
+STATE_NAME = 'sales'
+# Orders are stamped with `updated_at` before their transaction commits, so re-read a little before the
+# last refresh to pick up the ones that committed after it
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+DAY = '(o.placed_at AT TIME ZONE %(tz)s)::date'
+
+ROLLUP_SQL = [
+    f'''
+    INSERT INTO {{daily_sales}} (day, brand_id, category_id, currency, units, revenue)
+    SELECT {DAY}, product.brand_id, product.category_id, item.unit_price_currency,
+        sum(item.quantity), sum(item.quantity * item.unit_price)
+    FROM {{order}} o
+    JOIN {{order_item}} item ON item.order_id = o.id
+    JOIN {{product}} product ON product.id = item.product_id
+    WHERE o.status <> %(canceled)s AND {{days}}
+    GROUP BY 1, 2, 3, 4
+    ''',
+    f'''
+    INSERT INTO {{daily_product_sales}} (day, product_id, currency, units, revenue)
+    SELECT {DAY}, item.product_id, item.unit_price_currency, sum(item.quantity), sum(item.quantity * item.unit_price)
+    FROM {{order}} o JOIN {{order_item}} item ON item.order_id = o.id
+    WHERE o.status <> %(canceled)s AND {{days}}
+    GROUP BY 1, 2, 3
+    ''',
+    f'''
+    INSERT INTO {{daily_orders}} (day, status, currency, order_count, revenue)
+    SELECT {DAY}, o.status, o.total_price_currency, count(*), sum(o.total_price)
+    FROM {{order}} o
+    WHERE {{days}}
+    GROUP BY 1, 2, 3
+    ''',
+]
+
+IN_DAYS = f'o.placed_at >= %(start)s AND o.placed_at < %(end)s AND {DAY} = ANY(%(day_list)s::date[])'
+
+ROLLUPS = (DailySales, DailyProductSales, DailyOrders)
+
+
+def get_changed_days(since):
+    """Days (in ``TIME_ZONE``) on which the orders changed since ``since`` were placed"""
+    return sorted(set(
+        timezone.localtime(placed_at).date()
+        for placed_at in Order.objects.filter(updated_at__gte=since).values_list('placed_at', flat=True).distinct()
+    ))
+
+
+def add_pending_day(placed_at):
+    """Have the next refresh recompute the day of an order placed at ``placed_at``, such as a deleted one"""
+    # Without a state yet, the next refresh is a full one
+    RollupState.objects.filter(name=STATE_NAME).update(pending_days=Func(
+        F('pending_days'), Value(timezone.localtime(placed_at).date()), function='array_append',
+    ))
+
+
+def refresh_rollups(full=False):
+    """
+    Recompute the rollups of the days with orders changed (or deleted) since the last refresh, or of every day
+    when ``full`` is set (or on the first run). Returns the number of recomputed days, ``None`` for a full
+    refresh. Days are recomputed from scratch, in one transaction, so refreshing is idempotent.
+    """
+    started = timezone.now()
+
+    with transaction.atomic():
+        # Locked so the days of orders deleted meanwhile are recorded after the pending ones are cleared
+        state = RollupState.objects.select_for_update().filter(name=STATE_NAME).first()
+        full = full or state is None
+        days = None if full else sorted(
+            set(get_changed_days(state.refreshed_at - REFRESH_OVERLAP)) | set(state.pending_days)
+        )
+
+        if full:
+            for model in ROLLUPS:
+                model.objects.all().delete()
+            rollup(condition='TRUE', params={})
+        elif days:
+            for model in ROLLUPS:
+                model.objects.filter(day__in=days).delete()
+            zone = ZoneInfo(settings.TIME_ZONE)
+            rollup(condition=IN_DAYS, params={
+                'start': datetime.combine(days[0], time.min, tzinfo=zone),
+                'end': datetime.combine(days[-1] + timedelta(days=1), time.min, tzinfo=zone),
+                'day_list': days,
+            })
+        RollupState.objects.update_or_create(name=STATE_NAME, defaults={'refreshed_at': started, 'pending_days': []})
+
+    return None if full else len(days)
+
+
+def rollup(condition, params):
+    tables = {
+        'daily_sales': DailySales._meta.db_table,
+        'daily_product_sales': DailyProductSales._meta.db_table,
+        'daily_orders': DailyOrders._meta.db_table,
+        'order': Order._meta.db_table,
+        'order_item': OrderItem._meta.db_table,
+        'product': Product._meta.db_table,
+    }
+    params = {**params, 'tz': settings.TIME_ZONE, 'canceled': Order.Status.CANCELED}
+    with connection.cursor() as cursor:
+        for sql in ROLLUP_SQL:
+            cursor.execute(sql.format(days=condition, **tables), params)
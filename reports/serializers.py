@@ -0,0 +1,29 @@
+from rest_framework import serializers
+
+GROUPS = {
+    'day': ('day',),
+    'brand': ('brand_id', 'brand__name'),
+    'category': ('category_id', 'category__name'),
+}
+
+
+# noinspection PyAbstractClass
+class ReportQuerySerializer(serializers.Serializer):
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    currency = serializers.CharField(max_length=3, required=False)
+
+    def validate(self, attrs):
+        if 'since' in attrs and 'until' in attrs and attrs['since'] > attrs['until']:
+            raise serializers.ValidationError({'until': ['Must not be before since.']})
+        return attrs
+
+
+# noinspection PyAbstractClass
+class RevenueQuerySerializer(ReportQuerySerializer):
+    group_by = serializers.ChoiceField(choices=list(GROUPS), default='day')
+
+
+# noinspection PyAbstractClass
+class TopProductsQuerySerializer(ReportQuerySerializer):
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from shop.models import Order
+from .rollups import add_pending_day
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    # Deleted orders are not found by `get_changed_days` anymore
+    add_pending_day(instance.placed_at)
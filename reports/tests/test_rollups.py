@@ -0,0 +1,102 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from djmoney.money import Money
+
+from reports.models import DailySales, DailyProductSales, DailyOrders, RollupState
+from reports.rollups import refresh_rollups
+from shop.models import Product, Brand, Category, Order, OrderItem
+
+User = get_user_model()
+
+
+def sample_product(**params):
+    defaults = {
+        'title': 'Sample product',
+        'price': Money(10, 'USD'),
+        'brand': Brand.objects.create(name='Sample brand'),
+        'category': Category.objects.create(name='Sample category'),
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+def sample_order(user, day, items, status=Order.Status.PREPARING):
+    order = Order.objects.create(user=user, status=status)
+    for product, quantity in items:
+        OrderItem.objects.create(order=order, product=product, quantity=quantity, unit_price=product.price)
+    total = sum(product.price.amount * quantity for product, quantity in items)
+    placed_at = datetime.combine(day, datetime.min.time(), tzinfo=dt_timezone.utc) + timedelta(hours=12)
+    Order.objects.filter(pk=order.pk).update(placed_at=placed_at, total_price=Money(total, 'USD'))
+    return order
+
+
+class RefreshRollupsTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.product1 = sample_product(title='Product1')
+        self.product2 = sample_product(title='Product2', price=Money(5, 'USD'))
+        self.day1, self.day2 = date(2022, 3, 1), date(2022, 3, 2)
+
+    def test_full_refresh_rolls_up_every_day(self):
+        sample_order(self.user, self.day1, [(self.product1, 2), (self.product2, 1)])
+        sample_order(self.user, self.day1, [(self.product1, 1)])
+        sample_order(self.user, self.day2, [(self.product2, 4)], status=Order.Status.CANCELED)
+
+        self.assertIsNone(refresh_rollups())
+
+        sales = DailySales.objects.get(day=self.day1, brand=self.product1.brand)
+        self.assertEqual((sales.units, sales.revenue), (3, 30))
+        self.assertFalse(DailySales.objects.filter(day=self.day2).exists())
+        self.assertEqual(DailyProductSales.objects.get(day=self.day1, product=self.product2).units, 1)
+        self.assertEqual(
+            list(DailyOrders.objects.order_by('day').values_list('day', 'status', 'order_count', 'revenue')),
+            [(self.day1, 'preparing', 2, 35), (self.day2, 'canceled', 1, 20)],
+        )
+
+    def test_incremental_refresh_only_recomputes_changed_days(self):
+        sample_order(self.user, self.day1, [(self.product1, 1)])
+        order = sample_order(self.user, self.day2, [(self.product1, 1)])
+        refresh_rollups()
+        RollupState.objects.update(refreshed_at=timezone.now() - timedelta(hours=1))
+        Order.objects.filter(placed_at__date=self.day1).update(updated_at=timezone.now() - timedelta(days=1))
+        Order.objects.filter(pk=order.pk).update(status=Order.Status.SENT, updated_at=timezone.now())
+
+        self.assertEqual(refresh_rollups(), 1)
+
+        self.assertEqual(DailyOrders.objects.get(day=self.day2).status, 'sent')
+        self.assertEqual(DailyOrders.objects.get(day=self.day1).status, 'preparing')
+
+    def test_incremental_refresh_recomputes_the_days_of_deleted_orders(self):
+        sample_order(self.user, self.day1, [(self.product1, 1)])
+        order = sample_order(self.user, self.day2, [(self.product1, 1)])
+        refresh_rollups()
+        Order.objects.update(updated_at=timezone.now() - timedelta(days=1))
+
+        order.refresh_from_db()
+        order.items.all().delete()
+        order.delete()
+
+        self.assertEqual(RollupState.objects.get().pending_days, [self.day2])
+        self.assertEqual(refresh_rollups(), 1)
+        self.assertFalse(DailyOrders.objects.filter(day=self.day2).exists())
+        self.assertFalse(DailySales.objects.filter(day=self.day2).exists())
+        self.assertTrue(DailyOrders.objects.filter(day=self.day1).exists())
+        self.assertEqual(RollupState.objects.get().pending_days, [])
+
+    def test_command_refreshes_the_rollups(self):
+        sample_order(self.user, self.day1, [(self.product1, 1)])
+
+        out = StringIO()
+        call_command('refresh_sales_rollups', '--full', stdout=out)
+        Order.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        call_command('refresh_sales_rollups', stdout=out)
+
+        self.assertIn('Rebuilt the rollups of every day', out.getvalue())
+        self.assertIn('Refreshed the rollups of 0 days', out.getvalue())
+        self.assertEqual(DailySales.objects.count(), 1)
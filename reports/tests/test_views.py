@@ -0,0 +1,74 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from reports.models import DailySales, DailyProductSales, DailyOrders
+from reports.views import ReportViewSet
+from shop.models import Brand, Category, Product
+from shoppy.query_budget import QueryBudgetTestMixin
+
+User = get_user_model()
+
+
+class ReportViewsTestCase(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(self.user)
+
+        self.admin_client = APIClient()
+        self.admin_user = User.objects.create_superuser('superadmin', password='pass1234')
+        self.admin_client.force_authenticate(self.admin_user)
+
+        self.brand = Brand.objects.create(name='Brand1')
+        self.category = Category.objects.create(name='Category1')
+        self.day1, self.day2 = date(2022, 3, 1), date(2022, 3, 2)
+        for day, units in ((self.day1, 2), (self.day2, 3)):
+            DailySales.objects.create(
+                day=day, brand=self.brand, category=self.category, currency='USD', units=units, revenue=units * 10,
+            )
+
+    def test_reports_are_admin_only(self):
+        response = self.client.get(reverse('reports:reports-revenue'))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_revenue_per_day_and_brand(self):
+        with self.assertWithinQueryBudget(ReportViewSet, 'revenue'):
+            per_day = self.admin_client.get(reverse('reports:reports-revenue'))
+        per_brand = self.admin_client.get(reverse('reports:reports-revenue') + '?group_by=brand&since=2022-03-02')
+
+        self.assertEqual([(row['day'], row['units']) for row in per_day.data], [(self.day1, 2), (self.day2, 3)])
+        self.assertEqual(per_brand.data, [
+            {'brand_id': self.brand.id, 'brand__name': 'Brand1', 'currency': 'USD', 'units': 3, 'revenue': 30},
+        ])
+
+    def test_top_products(self):
+        products = [
+            Product.objects.create(title=f'Product{i}', price=1, brand=self.brand, category=self.category)
+            for i in range(3)
+        ]
+        for i, product in enumerate(products):
+            DailyProductSales.objects.create(day=self.day1, product=product, currency='USD', units=1, revenue=i)
+
+        response = self.admin_client.get(reverse('reports:reports-top-products') + '?limit=2')
+
+        self.assertEqual([row['product__title'] for row in response.data], ['Product2', 'Product1'])
+
+    def test_funnel(self):
+        DailyOrders.objects.create(day=self.day1, status='sent', currency='USD', order_count=2, revenue=20)
+        DailyOrders.objects.create(day=self.day2, status='sent', currency='USD', order_count=1, revenue=5)
+
+        response = self.admin_client.get(reverse('reports:reports-funnel'))
+
+        self.assertEqual(response.data, [{'status': 'sent', 'currency': 'USD', 'order_count': 3, 'revenue': 25}])
+
+    def test_invalid_range_returns_400(self):
+        response = self.admin_client.get(reverse('reports:reports-funnel') + '?since=2022-03-02&until=2022-03-01')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,10 @@
+from rest_framework.routers import DefaultRouter
+
+from reports.views import ReportViewSet
+
+app_name = 'reports'
+
+router = DefaultRouter()
+router.register('', ReportViewSet, basename='reports')
+
+urlpatterns = router.urls
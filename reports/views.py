@@ -0,0 +1,60 @@
+from django.db.models import Sum
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
+
+from .models import DailySales, DailyProductSales, DailyOrders
+from .serializers import GROUPS, ReportQuerySerializer, RevenueQuerySerializer, TopProductsQuerySerializer
+
+
+class ReportViewSet(GenericViewSet):
+    """
+    Sales reports, read from the daily rollups only (see `reports.rollups`), so they are as fresh
+    as the last `refresh_sales_rollups` run and never touch the order tables
+    """
+    permission_classes = [IsAdminUser]
+    query_budget = {'revenue': 1, 'top_products': 1, 'funnel': 1}
+
+    def get_query(self, serializer_class):
+        serializer = serializer_class(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @staticmethod
+    def filter_rollup(queryset, query):
+        if 'since' in query:
+            queryset = queryset.filter(day__gte=query['since'])
+        if 'until' in query:
+            queryset = queryset.filter(day__lte=query['until'])
+        if 'currency' in query:
+            queryset = queryset.filter(currency=query['currency'])
+        return queryset
+
+    @action(detail=False)
+    def revenue(self, request):
+        """Units sold and revenue per day, brand or category (``group_by``)"""
+        query = self.get_query(RevenueQuerySerializer)
+        fields = GROUPS[query['group_by']]
+        rows = self.filter_rollup(DailySales.objects.all(), query).values(*fields, 'currency').annotate(
+            units=Sum('units'), revenue=Sum('revenue'),
+        ).order_by(*fields, 'currency')
+        return Response(list(rows))
+
+    @action(detail=False, url_path='top-products')
+    def top_products(self, request):
+        """The ``limit`` products with the most revenue"""
+        query = self.get_query(TopProductsQuerySerializer)
+        rows = self.filter_rollup(DailyProductSales.objects.all(), query).values(
+            'product_id', 'product__title', 'currency',
+        ).annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue', 'product_id')
+        return Response(list(rows[:query['limit']]))
+
+    @action(detail=False)
+    def funnel(self, request):
+        """Orders and their revenue per current status"""
+        query = self.get_query(ReportQuerySerializer)
+        rows = self.filter_rollup(DailyOrders.objects.all(), query).values('status', 'currency').annotate(
+            order_count=Sum('order_count'), revenue=Sum('revenue'),
+        ).order_by('status', 'currency')
+        return Response(list(rows))
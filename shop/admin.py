@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Product, Brand, Category
+from .models import Product, Brand, Category, Stock, Order, OrderItem
 
 
 @admin.register(Brand)
@@ -15,8 +15,32 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 
+class StockInline(admin.TabularInline):
+    model = Stock
+    extra = 0
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'price', 'color', 'size', 'brand', 'category')
     list_select_related = ('brand', 'category')
     autocomplete_fields = ('brand', 'category')
+    inlines = (StockInline,)
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    fields = ('product_id', 'product_title', 'unit_price', 'quantity')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    # Only stored columns, so listing orders never joins their items or products
+    list_display = ('id', 'user', 'placed_at', 'status', 'item_count', 'total_price')
+    list_filter = ('status',)
+    list_select_related = ('user',)
+    readonly_fields = ('user', 'placed_at', 'item_count', 'total_price')
+    inlines = (OrderItemInline,)
@@ -0,0 +1,194 @@
+from datetime import datetime
+from hashlib import md5
+from time import time_ns
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework.response import Response
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'KEY_PREFIX': 'shop:response',
+}
+
+
+def get_cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'SHOP_RESPONSE_CACHE', {})}
+
+
+def get_cache():
+    return caches[get_cache_settings()['ALIAS']]
+
+
+def generation_key(model):
+    return f'{get_cache_settings()["KEY_PREFIX"]}:generation:{model._meta.label_lower}'
+
+
+def get_generations(models):
+    """
+    Return the current generation of every model. Generations start from the current time
+    rather than zero, so a generation evicted from the cache never comes back to an old value.
+    """
+    cache = get_cache()
+    keys = [generation_key(model) for model in models]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time_ns(), timeout=None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def bump_generation(model):
+    cache = get_cache()
+    key = generation_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time_ns(), timeout=None)
+
+
+def invalidate(model):
+    """
+    Invalidate every cached response depending on ``model``: right away, and once more after
+    the current transaction commits so a response cached from pre-commit data is dropped too
+    """
+    bump_generation(model)
+    transaction.on_commit(lambda: bump_generation(model))
+
+
+def matches_etag(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(if_none_match)]
+    return etag in etags or '*' in etags
+
+
+class CachedResponseMixin:
+    """
+    Cache rendered ``list``/``retrieve`` responses keyed by path, query params, API version and media type.
+    Entries are invalidated by bumping the generation of any model in ``cache_dependencies`` (see
+    ``shop.signals``) and carry an ETag, so clients sending ``If-None-Match`` get a 304.
+    """
+    cache_dependencies = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request):
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        generations = get_generations(self.cache_dependencies)
+        # Responses hold absolute links to other pages, built from the host and scheme of the request
+        raw = '|'.join(map(str, [
+            request.scheme, request.get_host(), request.path, query, request.version, request.accepted_media_type,
+            *generations,
+        ]))
+        return f'{get_cache_settings()["KEY_PREFIX"]}:{md5(raw.encode()).hexdigest()}'
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        # Only cache plain JSON: the browsable API renders user specific content
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        entry = get_cache().get(key)
+        if entry is None:
+            request.response_cache_key = key
+            return handler(request, *args, **kwargs)
+
+        if matches_etag(request, entry['etag']):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(request, 'response_cache_key', None)
+        if key is None or not isinstance(response, Response) or response.status_code != 200:
+            return response
+
+        response.render()
+        etag = quote_etag(md5(response.content).hexdigest())
+        get_cache().set(key, {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': etag,
+        }, get_cache_settings()['TIMEOUT'])
+
+        response['ETag'] = etag
+        if matches_etag(request, etag):
+            not_modified = HttpResponseNotModified()
+            not_modified['ETag'] = etag
+            return not_modified
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Answer ``If-None-Match``/``If-Modified-Since`` on ``list``/``retrieve`` from a single aggregate
+    query over ``get_conditional_aggregates()``, returning a 304 before anything is serialized.
+    """
+
+    def get_conditional_aggregates(self):
+        return {
+            'count': Count('pk', distinct=True),
+            'updated_at': Max('updated_at'),
+        }
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.get_conditional_response(queryset, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_queryset()
+        try:
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (ValueError, ValidationError):
+            # Let the regular handler answer with a 404
+            return super().retrieve(request, *args, **kwargs)
+        return self.get_conditional_response(queryset, super().retrieve, request, *args, **kwargs)
+
+    def get_conditional_response(self, queryset, handler, request, *args, **kwargs):
+        state = queryset.order_by().aggregate(**self.get_conditional_aggregates())
+        if not state['count'] and self.action == 'retrieve':
+            return handler(request, *args, **kwargs)
+
+        last_modified = max((value for value in state.values() if isinstance(value, datetime)), default=None)
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        raw = '|'.join(map(str, [request.path, query, request.version, request.accepted_media_type, *state.values()]))
+        request.conditional_etag = quote_etag(md5(raw.encode()).hexdigest())
+        request.conditional_last_modified = last_modified and http_date(last_modified.timestamp())
+
+        if self.is_not_modified(request, request.conditional_etag, last_modified):
+            return HttpResponseNotModified()
+        return handler(request, *args, **kwargs)
+
+    @staticmethod
+    def is_not_modified(request, etag, last_modified):
+        if request.META.get('HTTP_IF_NONE_MATCH'):
+            return matches_etag(request, etag)
+        since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return bool(since and last_modified and int(last_modified.timestamp()) <= since)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(request, 'conditional_etag', None)
+        if etag is not None and response.status_code in (200, 304):
+            response['ETag'] = etag
+            if request.conditional_last_modified:
+                response['Last-Modified'] = request.conditional_last_modified
+        return response
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from time import sleep
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+DEFAULTS = {
+    # Carts without any change for that long (in seconds) are abandoned and deleted by `reap_idle_carts`
+    'IDLE_TTL': 60 * 60 * 24 * 30,
+    'REAP_BATCH_SIZE': 1000,
+}
+
+# Delete one batch of idle carts and their items in one short statement. Carts locked by a concurrent
+# change or checkout are skipped, and a cart changed since it was picked is not idle anymore when locked.
+REAP_SQL = '''
+    WITH idle AS (
+        SELECT id FROM {cart} WHERE updated_at < %(idle_before)s
+        ORDER BY updated_at
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED
+    ), items AS (
+        DELETE FROM {cart_item} WHERE cart_id IN (SELECT id FROM idle) RETURNING id
+    ), carts AS (
+        DELETE FROM {cart} WHERE id IN (SELECT id FROM idle) RETURNING id
+    )
+    SELECT (SELECT count(*) FROM carts), (SELECT count(*) FROM items)
+'''
+
+STORAGE_SQL = '''
+    SELECT
+        relation.relname, greatest(relation.reltuples, 0)::bigint, pg_table_size(relation.oid),
+        pg_indexes_size(relation.oid), pg_total_relation_size(relation.oid)
+    FROM pg_class relation
+    WHERE relation.oid IN (%(cart)s::regclass, %(cart_item)s::regclass)
+    ORDER BY relation.relname
+'''
+
+
+def get_cart_settings():
+    return {**DEFAULTS, **getattr(settings, 'SHOP_CARTS', {})}
+
+
+def get_idle_before():
+    return timezone.now() - timedelta(seconds=get_cart_settings()['IDLE_TTL'])
+
+
+def reap_idle_carts(idle_before=None, batch_size=None, pause=0):
+    """
+    Delete the carts (and their items) unchanged since ``idle_before``, ``IDLE_TTL`` ago by default, in
+    batches of ``batch_size`` committed one at a time, so rows are only locked for the duration of a batch.
+    Sleeps ``pause`` seconds between batches to leave room to the regular traffic.
+    Returns the number of deleted carts and items.
+    """
+    idle_before = idle_before or get_idle_before()
+    batch_size = batch_size or get_cart_settings()['REAP_BATCH_SIZE']
+    sql = REAP_SQL.format(cart=Cart._meta.db_table, cart_item=CartItem._meta.db_table)
+
+    total_carts = total_items = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'idle_before': idle_before, 'batch_size': batch_size})
+            carts, items = cursor.fetchone()
+        total_carts += carts
+        total_items += items
+        if carts < batch_size:
+            return total_carts, total_items
+        if pause:
+            sleep(pause)
+
+
+def get_cart_storage_stats():
+    """
+    Estimated rows and on-disk sizes (in bytes) of the cart tables and their indexes, plus the number of
+    carts the next reaping would delete
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(STORAGE_SQL, {'cart': Cart._meta.db_table, 'cart_item': CartItem._meta.db_table})
+        tables = {
+            name: {'rows': rows, 'table_size': table_size, 'indexes_size': indexes_size, 'total_size': total_size}
+            for name, rows, table_size, indexes_size, total_size in cursor.fetchall()
+        }
+    return {'tables': tables, 'idle_carts': Cart.objects.filter(updated_at__lt=get_idle_before()).count()}
@@ -0,0 +1,237 @@
+from contextlib import contextmanager
+from decimal import Decimal
+from time import monotonic, sleep
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .carts import (
+    ADD, MAX_QUANTITY, REMOVE, CartNotFound, ProductNotFound, QuantityTooLarge, merge_items, parse_cart_id,
+)
+from .models import Cart, CartItem, Product
+
+DEFAULTS = {
+    # `None` keeps carts in the `Cart`/`CartItem` tables, or the import path of a cart store class
+    'BACKEND': None,
+    'ALIAS': 'default',
+    'KEY_PREFIX': 'shop:cart',
+    # Carts expire when left unchanged for that long (in seconds)
+    'TTL': 60 * 60 * 24 * 30,
+}
+
+# Locks expire after that long (in seconds), so a crashed request does not keep its cart locked
+LOCK_TIMEOUT = 5
+
+# Write a cart and its items to the database in one statement, dropping the products deleted since they were added
+MATERIALIZE_SQL = '''
+    WITH cart AS (
+        INSERT INTO {cart} (id, created_at, updated_at, item_count, total_price, total_price_currency)
+        VALUES (%(cart_id)s, %(created_at)s, %(now)s, 0, 0, %(currency)s)
+        RETURNING id
+    )
+    INSERT INTO {cart_item} (cart_id, product_id, quantity)
+    SELECT cart.id, product.id, batch.quantity
+    FROM cart, unnest(%(product_ids)s::bigint[], %(quantities)s::integer[]) WITH ORDINALITY
+        AS batch (product_id, quantity, position)
+    JOIN {product} product ON product.id = batch.product_id
+    ORDER BY batch.position
+'''
+
+
+def get_cart_store_settings():
+    return {**DEFAULTS, **getattr(settings, 'SHOP_CART_STORE', {})}
+
+
+def get_cart_store():
+    """The configured cart store, or ``None`` when carts are stored in the database"""
+    store_settings = get_cart_store_settings()
+    if store_settings['BACKEND'] is None:
+        return None
+    return import_string(store_settings['BACKEND'])(store_settings)
+
+
+class CartBusy(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The cart is being changed by another request, try again.'
+    default_code = 'cart_busy'
+
+
+class CartItemNotFound(Exception):
+    pass
+
+
+class CacheCartStore:
+    """
+    Keep carts in a Django cache (Redis in production, the local memory cache in tests) rather than in the
+    database, as ``{'created_at': ..., 'items': {product_id: quantity}}`` entries expiring after ``TTL``
+    seconds without a change. Cart items are identified by their product id.
+
+    Carts read from the store are built as unsaved ``Cart``/``CartItem`` instances, with their items, products
+    and totals loaded in a single query, so `CartSerializer` renders them as it renders stored carts. They are
+    only written to the database by `check_out`, to be turned into an order.
+    """
+
+    def __init__(self, store_settings):
+        self.cache = caches[store_settings['ALIAS']]
+        self.key_prefix = store_settings['KEY_PREFIX']
+        self.ttl = store_settings['TTL']
+
+    def get_key(self, cart_id):
+        return f'{self.key_prefix}:{cart_id}'
+
+    def get_lock_key(self, cart_id):
+        return f'{self.get_key(cart_id)}:lock'
+
+    @contextmanager
+    def locked(self, cart_id):
+        """
+        Hold the lock of a cart, so concurrent changes are applied one after the other. Yields the token
+        identifying this holder: the lock is only released while it still holds it, not once it expired
+        and was taken by another request.
+        """
+        key = self.get_lock_key(cart_id)
+        token = uuid4().hex
+        deadline = monotonic() + LOCK_TIMEOUT
+        while not self.cache.add(key, token, timeout=LOCK_TIMEOUT):
+            if monotonic() > deadline:
+                raise CartBusy()
+            sleep(0.01)
+        try:
+            yield token
+        finally:
+            if self.cache.get(key) == token:
+                self.cache.delete(key)
+
+    def renew_lock(self, cart_id, token):
+        """Extend the lock of a cart for another ``LOCK_TIMEOUT``; `CartBusy` when it was lost meanwhile"""
+        key = self.get_lock_key(cart_id)
+        if self.cache.get(key) != token or not self.cache.touch(key, LOCK_TIMEOUT):
+            raise CartBusy()
+
+    def get_entry(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        entry = self.cache.get(self.get_key(cart_id))
+        if entry is None:
+            raise CartNotFound(cart_id)
+        return cart_id, entry
+
+    def set_entry(self, cart_id, entry):
+        entry['updated_at'] = timezone.now()
+        self.cache.set(self.get_key(cart_id), entry, timeout=self.ttl)
+
+    def create(self):
+        cart_id = uuid4()
+        entry = {'created_at': timezone.now(), 'items': {}}
+        self.set_entry(cart_id, entry)
+        return self.build_cart(cart_id, entry, {})
+
+    def get(self, cart_id):
+        cart_id, entry = self.get_entry(cart_id)
+        return self.build_cart(cart_id, entry, Product.objects.in_bulk(list(entry['items'])))
+
+    def delete(self, cart_id):
+        cart_id, _ = self.get_entry(cart_id)
+        self.cache.delete(self.get_key(cart_id))
+
+    def add_item(self, cart_id, product_id, quantity):
+        """Add ``quantity`` units of a product, returns the ``(id, quantity)`` of the cart item"""
+        if not Product.objects.filter(pk=product_id).exists():
+            raise ProductNotFound(product_id)
+        with self.locked(cart_id):
+            cart_id, entry = self.get_entry(cart_id)
+            entry['items'][product_id] = self.add_quantity(entry, product_id, quantity)
+            self.set_entry(cart_id, entry)
+        return product_id, entry['items'][product_id]
+
+    def update_item(self, cart_id, item_id, quantity):
+        with self.locked(cart_id):
+            cart_id, entry = self.get_entry(cart_id)
+            if item_id not in entry['items']:
+                raise CartItemNotFound(item_id)
+            entry['items'][item_id] = quantity
+            self.set_entry(cart_id, entry)
+
+    def remove_item(self, cart_id, item_id):
+        with self.locked(cart_id):
+            cart_id, entry = self.get_entry(cart_id)
+            if entry['items'].pop(item_id, None) is None:
+                raise CartItemNotFound(item_id)
+            self.set_entry(cart_id, entry)
+
+    def change_items(self, cart_id, operation, items):
+        """Apply a batch of ``(product_id, quantity)`` pairs, see `shop.carts.bulk_change_cart_items`"""
+        with self.locked(cart_id):
+            cart_id, entry = self.get_entry(cart_id)
+            for product_id, quantity in merge_items(operation, items).items():
+                if operation == REMOVE:
+                    entry['items'].pop(product_id, None)
+                elif operation == ADD:
+                    entry['items'][product_id] = self.add_quantity(entry, product_id, quantity)
+                else:
+                    entry['items'][product_id] = quantity
+            self.set_entry(cart_id, entry)
+
+    @staticmethod
+    def add_quantity(entry, product_id, quantity):
+        """The quantity of a product once ``quantity`` units are added, at most ``MAX_QUANTITY`` like stored items"""
+        quantity += entry['items'].get(product_id, 0)
+        if quantity > MAX_QUANTITY:
+            raise QuantityTooLarge(product_id)
+        return quantity
+
+    def check_out(self, cart_id, place_order):
+        """
+        Write the cart to the database and call ``place_order(cart_id)`` in the same transaction, so the cart
+        only leaves the store once the order is placed. The lock makes concurrent checkouts of a cart find it
+        gone rather than placing it twice. It is renewed before the order is committed, and the order is rolled
+        back when the lock expired meanwhile, as the cart may have been changed since it was read.
+        """
+        with self.locked(cart_id) as token:
+            cart_id, entry = self.get_entry(cart_id)
+            sql = MATERIALIZE_SQL.format(
+                cart=Cart._meta.db_table, cart_item=CartItem._meta.db_table, product=Product._meta.db_table,
+            )
+            params = {
+                'cart_id': cart_id, 'created_at': entry['created_at'], 'now': timezone.now(),
+                'currency': Cart._meta.get_field('total_price').default_currency,
+                'product_ids': list(entry['items']), 'quantities': list(entry['items'].values()),
+            }
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+                order = place_order(cart_id)
+                self.renew_lock(cart_id, token)
+            self.cache.delete(self.get_key(cart_id))
+        return order
+
+    @staticmethod
+    def build_cart(cart_id, entry, products):
+        cart = Cart(id=cart_id, created_at=entry['created_at'], updated_at=entry['updated_at'])
+        cart._state.adding = False
+        items = []
+        for product_id, quantity in entry['items'].items():
+            product = products.get(product_id)
+            if product is None:
+                continue
+            item = CartItem(id=product_id, cart=cart, product=product, quantity=quantity)
+            item.total_price = product.price.amount * quantity
+            item._state.adding = False
+            items.append(item)
+
+        # Like stored carts, the cart takes the currency of the first product added to it
+        currency = items[0].product.price_currency if items else Cart._meta.get_field('total_price').default_currency
+        cart.item_count = sum(item.quantity for item in items)
+        cart.total_price = Money(sum((item.total_price for item in items), Decimal(0)), currency)
+
+        queryset = cart.items.all()
+        queryset._result_cache = items
+        queryset._prefetch_done = True
+        cart._prefetched_objects_cache = {'items': queryset}
+        return cart
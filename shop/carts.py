@@ -0,0 +1,206 @@
+from decimal import Decimal
+from uuid import UUID
+
+from django.db import DataError, connection, transaction
+from django.db.models import (
+    Case, CharField, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .models import Cart, CartItem, Product
+
+AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+# Cart item quantities are stored in a ``smallint``
+MAX_QUANTITY = 32767
+
+
+def amount(expression):
+    # django-money rewrites expressions assigned to or compared with a money field, unless they are a `Cast`
+    return Cast(expression, AMOUNT_FIELD)
+
+
+def line_total():
+    """``quantity * product price`` of a cart item, computed by the database"""
+    return ExpressionWrapper(F('quantity') * F('product__price'), output_field=AMOUNT_FIELD)
+
+
+def apply_cart_change(cart_id, product_id, quantity):
+    """
+    Add ``quantity`` (negative to remove) units of a product to the stored totals of a cart
+    in a single ``UPDATE``. The cart takes the currency of the first product added to it.
+    """
+    product = Product.objects.filter(pk=product_id)
+    Cart.objects.filter(pk=cart_id).update(
+        item_count=F('item_count') + quantity,
+        total_price=amount(F('total_price') + Subquery(product.values('price')[:1]) * quantity),
+        total_price_currency=Case(
+            When(item_count=0, then=Subquery(product.values('price_currency')[:1])),
+            default=F('total_price_currency'),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+ADD_ITEM_SQL = '''
+    WITH product AS (
+        SELECT id, price, price_currency FROM {product} WHERE id = %(product_id)s
+    ), item AS (
+        INSERT INTO {item} (cart_id, product_id, quantity)
+        SELECT cart.id, product.id, %(quantity)s FROM {cart} cart, product WHERE cart.id = %(cart_id)s
+        ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = {item}.quantity + EXCLUDED.quantity
+        WHERE {item}.quantity::integer + EXCLUDED.quantity <= %(max_quantity)s
+        RETURNING id, quantity
+    ), totals AS (
+        UPDATE {cart} SET
+            item_count = item_count + %(quantity)s,
+            total_price = total_price + product.price * %(quantity)s,
+            total_price_currency = CASE WHEN item_count = 0 THEN product.price_currency ELSE total_price_currency END,
+            updated_at = %(now)s
+        FROM product, item WHERE {cart}.id = %(cart_id)s
+    )
+    SELECT EXISTS (SELECT 1 FROM product), EXISTS (SELECT 1 FROM {cart} WHERE id = %(cart_id)s), item.id, item.quantity
+    FROM (VALUES (1)) AS one LEFT JOIN item ON TRUE
+'''
+
+
+BULK_UPSERT_SQL = '''
+    INSERT INTO {item} (cart_id, product_id, quantity)
+    SELECT %(cart_id)s, product.id, batch.quantity
+    FROM unnest(%(product_ids)s::bigint[], %(quantities)s::integer[]) AS batch (product_id, quantity)
+    JOIN {product} product ON product.id = batch.product_id
+    ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = {quantity}
+'''
+
+ADD, SET, REMOVE = 'add', 'set', 'remove'
+BULK_OPERATIONS = (ADD, SET, REMOVE)
+
+
+class CartNotFound(Exception):
+    pass
+
+
+class ProductNotFound(Exception):
+    pass
+
+
+class QuantityTooLarge(Exception):
+    pass
+
+
+def parse_cart_id(cart_id):
+    try:
+        return UUID(str(cart_id))
+    except ValueError:
+        raise CartNotFound(cart_id)
+
+
+def add_cart_item(cart_id, product_id, quantity):
+    """
+    Add ``quantity`` units of a product to a cart and update the cart totals in a single statement.
+    Concurrent additions of the same product are merged by ``ON CONFLICT`` instead of racing on a
+    read-modify-write, and missing carts or products are detected by the statement itself rather
+    than by the (deferred) foreign key constraints. Additions taking the quantity of the item above
+    ``MAX_QUANTITY`` are left out. Returns the ``(id, quantity)`` of the cart item.
+    """
+    cart_id = parse_cart_id(cart_id)
+    sql = ADD_ITEM_SQL.format(
+        product=Product._meta.db_table, item=CartItem._meta.db_table, cart=Cart._meta.db_table,
+    )
+    params = {
+        'cart_id': cart_id, 'product_id': product_id, 'quantity': quantity, 'max_quantity': MAX_QUANTITY,
+        'now': timezone.now(),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        product_exists, cart_exists, item_id, item_quantity = cursor.fetchone()
+
+    if not product_exists:
+        raise ProductNotFound(product_id)
+    if not cart_exists:
+        raise CartNotFound(cart_id)
+    if item_id is None:
+        raise QuantityTooLarge(product_id)
+    return item_id, item_quantity
+
+
+def merge_items(operation, items):
+    """Merge ``(product_id, quantity)`` pairs of the same product: added quantities sum up, the last set one wins"""
+    merged = {}
+    for product_id, quantity in items:
+        merged[product_id] = merged.get(product_id, 0) + quantity if operation == ADD else quantity
+    return merged
+
+
+def bulk_change_cart_items(cart_id, operation, items):
+    """
+    Apply a batch of ``(product_id, quantity)`` pairs to a cart in one transaction: ``add`` the quantities,
+    ``set`` them, or ``remove`` the products from the cart. Items are written with a single ``INSERT``
+    (or ``DELETE``) whatever the size of the batch, then the cart totals are recalculated once.
+    Raises `QuantityTooLarge`, leaving the cart as it was, when a quantity would exceed ``MAX_QUANTITY``.
+    """
+    cart_id = parse_cart_id(cart_id)
+    merged = merge_items(operation, items)
+    for product_id, quantity in merged.items():
+        if quantity > MAX_QUANTITY:
+            raise QuantityTooLarge(product_id)
+
+    try:
+        with transaction.atomic():
+            # Lock the cart so concurrent batches and single item changes are applied one after the other
+            if not Cart.objects.select_for_update().filter(pk=cart_id).values_list('pk', flat=True):
+                raise CartNotFound(cart_id)
+
+            if operation == REMOVE:
+                CartItem.objects.filter(cart_id=cart_id, product_id__in=merged).delete()
+            elif merged:
+                table = CartItem._meta.db_table
+                quantity = f'{table}.quantity + EXCLUDED.quantity' if operation == ADD else 'EXCLUDED.quantity'
+                sql = BULK_UPSERT_SQL.format(item=table, product=Product._meta.db_table, quantity=quantity)
+                params = {'cart_id': cart_id, 'product_ids': list(merged), 'quantities': list(merged.values())}
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+
+            recalculate_cart_totals(Cart.objects.filter(pk=cart_id))
+    except DataError as error:
+        # Added quantities overflowing the ones already in the cart
+        raise QuantityTooLarge(None) from error
+
+
+def expected_totals():
+    """Annotations computing the totals a cart should store from its items and current prices"""
+    items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    return {
+        'expected_item_count': Coalesce(
+            Subquery(items.annotate(total=Sum('quantity')).values('total')),
+            0, output_field=IntegerField(),
+        ),
+        'expected_total_price': Coalesce(
+            Subquery(items.annotate(total=Sum(line_total())).values('total')),
+            Value(Decimal(0)), output_field=AMOUNT_FIELD,
+        ),
+        'expected_currency': Coalesce(
+            Subquery(CartItem.objects.filter(cart=OuterRef('pk')).order_by('id').values('product__price_currency')[:1]),
+            F('total_price_currency'), output_field=CharField(),
+        ),
+    }
+
+
+def recalculate_cart_totals(carts):
+    """Recompute the stored totals of the ``carts`` queryset from scratch; returns the number of carts updated"""
+    totals = expected_totals()
+    return carts.update(
+        item_count=totals['expected_item_count'],
+        total_price=amount(totals['expected_total_price']),
+        total_price_currency=totals['expected_currency'],
+        updated_at=timezone.now(),
+    )
+
+
+def drifted_carts(carts):
+    """Carts of the ``carts`` queryset whose stored totals do not match their items"""
+    return carts.annotate(**expected_totals()).exclude(
+        item_count=F('expected_item_count'),
+        total_price=amount(F('expected_total_price')),
+        total_price_currency=F('expected_currency'),
+    )
@@ -0,0 +1,203 @@
+import csv
+import json
+import zlib
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import caching, suggest
+from .carts import recalculate_cart_totals
+from .models import Product, Brand, Category, Cart
+from .serializers import ProductImportSerializer
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+STREAM_CHUNK_SIZE = 64 * 1024
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
+
+# Columns of an import or export, brands and categories are given by name
+FIELDS = ('id', 'title', 'description', 'price', 'price_currency', 'size', 'color', 'brand', 'category')
+EXPORT_COLUMNS = (
+    'id', 'title', 'description', 'price', 'price_currency', 'size', 'color', 'brand__name', 'category__name',
+)
+
+
+def guess_format(file_name):
+    """The format of a catalog file from its extension, or ``None``"""
+    extension = file_name.rsplit('.', 1)[-1].lower()
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(extension)
+
+
+def read_rows(file, file_format):
+    """
+    Yield the ``(line_number, row)`` of a CSV (with a header line) or JSON Lines text stream, reading
+    it one line at a time. Empty CSV cells are left out; lines that are not valid JSON are yielded as is
+    and rejected by the validation.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if key is not None and value != ''}
+        return
+
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, line
+
+
+def import_products(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create the products of the ``(line_number, row)`` pairs, or update those of rows with an ``id``, in
+    batches of ``batch_size`` rows written with ``bulk_create``/``bulk_update`` in their own transaction.
+    Missing brands and categories are created. Invalid rows are reported and skipped, so they never abort
+    the import. Returns ``{'created': ..., 'updated': ..., 'errors': [{'line': ..., 'errors': ...}]}``.
+    """
+    result = {'created': 0, 'updated': 0, 'errors': []}
+    ids_by_name = {Brand: get_ids_by_name(Brand), Category: get_ids_by_name(Category)}
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        import_batch(batch, ids_by_name, result)
+    return result
+
+
+def get_ids_by_name(model):
+    # Names are not unique, the oldest object of a name wins
+    return dict(model.objects.order_by('-pk').values_list('name', 'pk'))
+
+
+def import_batch(batch, ids_by_name, result):
+    validator = ProductImportSerializer()
+    valid, errors = [], []
+    for line, row in batch:
+        try:
+            valid.append((line, validator.run_validation(row)))
+        except ValidationError as e:
+            errors.append({'line': line, 'errors': e.detail})
+
+    ids = {data['id'] for _, data in valid if 'id' in data}
+    # Updated products keep the values of the columns their row leaves out
+    existing = Product.objects.in_bulk(ids) if ids else {}
+    for line, data in valid:
+        if 'id' in data and data['id'] not in existing:
+            errors.append({'line': line, 'errors': {'id': ['No product with the given ID was found.']}})
+    result['errors'].extend(sorted(errors, key=lambda error: error['line']))
+    valid = [(line, data) for line, data in valid if 'id' not in data or data['id'] in existing]
+    if not valid:
+        return
+
+    now = timezone.now()
+    created, updated = [], []
+    update_fields = {'brand', 'category', 'updated_at'}
+    with transaction.atomic():
+        created_names = [
+            create_missing(model, ids_by_name[model], {data[field] for _, data in valid})
+            for model, field in ((Brand, 'brand'), (Category, 'category'))
+        ]
+        for _, data in valid:
+            data = dict(data)
+            brand_id = ids_by_name[Brand][data.pop('brand')]
+            category_id = ids_by_name[Category][data.pop('category')]
+            if 'id' not in data:
+                created.append(Product(brand_id=brand_id, category_id=category_id, **data))
+                continue
+
+            product = existing[data.pop('id')]
+            for name, value in data.items():
+                setattr(product, name, value)
+            update_fields.update(data)
+            # The price is validated as `Money`, it sets both columns
+            if 'price' in data:
+                update_fields.add('price_currency')
+            product.brand_id, product.category_id, product.updated_at = brand_id, category_id, now
+            updated.append(product)
+
+        Product.objects.bulk_create(created)
+        # Rows of a batch may set different columns, the others are written back as they were loaded
+        Product.objects.bulk_update(updated, sorted(update_fields))
+        # Signals are not sent for bulk writes, so do what `shop.signals` does on saving a product
+        repriced = [product.pk for product in updated if product.has_price_changed()]
+        if repriced:
+            recalculate_cart_totals(Cart.objects.filter(items__product__in=repriced))
+
+        for model, changed in ((Product, True), (Brand, created_names[0]), (Category, created_names[1])):
+            if changed:
+                caching.invalidate(model)
+        suggest.cache.clear()
+
+    result['created'] += len(created)
+    result['updated'] += len(updated)
+
+
+def create_missing(model, ids_by_name, names):
+    """Create the objects of ``names`` missing from ``ids_by_name`` in one statement, and add them to it"""
+    missing = sorted(names - ids_by_name.keys())
+    for obj in model.objects.bulk_create([model(name=name) for name in missing]):
+        ids_by_name[obj.name] = obj.pk
+    return bool(missing)
+
+
+class Echo:
+    """A file-like object returning what is written to it, for the `csv` module to encode single rows"""
+
+    def write(self, value):
+        return value
+
+
+def export_products(file_format, queryset=None, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the ``queryset`` products (all by default) as CSV or JSON Lines, one line at a time. Rows are
+    plain tuples joined to their brand and category names, read ``chunk_size`` at a time from a server-side
+    cursor, so the export never holds the catalog in memory. With ``since``, only the products modified
+    since then are exported, including those whose brand or category was renamed.
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    if since is not None:
+        queryset = queryset.filter(
+            Q(updated_at__gte=since)
+            | Q(brand__in=Brand.objects.filter(updated_at__gte=since))
+            | Q(category__in=Category.objects.filter(updated_at__gte=since))
+        )
+    rows = queryset.order_by('id').values_list(*EXPORT_COLUMNS).iterator(chunk_size=chunk_size)
+
+    if file_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+        return
+
+    for row in rows:
+        yield json.dumps(dict(zip(FIELDS, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def encode_lines(lines, size=STREAM_CHUNK_SIZE):
+    """Encode ``lines`` to UTF-8 in chunks of about ``size`` bytes, rather than sending every line on its own"""
+    chunk, length = [], 0
+    for line in lines:
+        data = line.encode()
+        chunk.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+def gzip_chunks(chunks):
+    """Compress a stream of byte ``chunks`` into a gzip stream as they come"""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,195 @@
+import csv
+import json
+import os
+import shutil
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from urllib.parse import urljoin
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef
+
+from .models import Product, Brand, Category, Stock
+
+DEFAULTS = {
+    'DIRECTORY': 'feeds',
+    'SEGMENT_SIZE': 5000,
+    'SITE_URL': 'http://localhost:8000',
+    'PRODUCT_URL': '{site_url}/products/{id}/',
+    'TITLE': 'Shoppy',
+}
+
+FORMATS = ('xml', 'csv')
+
+CSV_COLUMNS = (
+    'id', 'title', 'description', 'link', 'image_link', 'price', 'brand', 'product_type', 'availability', 'condition',
+)
+
+XML_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">
+<channel>
+<title>{title}</title>
+<link>{site_url}</link>
+'''
+XML_FOOTER = '''</channel>
+</rss>
+'''
+
+# What a segment of the feed depends on: its products, their brand and category, and which of them are in stock
+# (stock changes do not touch the products, and swapping the availability of two products keeps the counts).
+# A segment whose signature changed since the last run is rendered again, the others are reused as they are.
+SIGNATURES_SQL = '''
+    SELECT
+        product.id / %(segment_size)s, count(*),
+        max(greatest(product.updated_at, brand.updated_at, category.updated_at)),
+        md5(coalesce(string_agg(product.id::text, ',' ORDER BY product.id) FILTER (WHERE EXISTS (
+            SELECT 1 FROM {stock} stock WHERE stock.product_id = product.id AND stock.available > 0
+        ) OR NOT EXISTS (
+            SELECT 1 FROM {stock} stock WHERE stock.product_id = product.id
+        )), ''))
+    FROM {product} product
+    JOIN {brand} brand ON brand.id = product.brand_id
+    JOIN {category} category ON category.id = product.category_id
+    GROUP BY 1
+'''
+
+
+def get_feed_settings():
+    return {**DEFAULTS, **getattr(settings, 'SHOP_FEED', {})}
+
+
+def get_feed_path(file_format):
+    """Path of the feed under ``MEDIA_ROOT``, where it is served as a static file"""
+    return os.path.join(settings.MEDIA_ROOT, get_feed_settings()['DIRECTORY'], f'products.{file_format}')
+
+
+def get_segments_directory(file_format):
+    return os.path.join(settings.MEDIA_ROOT, get_feed_settings()['DIRECTORY'], f'.segments-{file_format}')
+
+
+def write_atomically(path, write):
+    """Call ``write`` with a temporary file next to ``path``, then move it in place of ``path``"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with NamedTemporaryFile('w', encoding='utf-8', newline='', dir=directory, delete=False) as file:
+        try:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        except BaseException:
+            os.unlink(file.name)
+            raise
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
+
+
+def get_signatures():
+    sql = SIGNATURES_SQL.format(
+        product=Product._meta.db_table, brand=Brand._meta.db_table, category=Category._meta.db_table,
+        stock=Stock._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'segment_size': get_feed_settings()['SEGMENT_SIZE']})
+        return {
+            str(segment): [count, updated_at.isoformat(), in_stock] for segment, count, updated_at, in_stock in cursor
+        }
+
+
+def generate_feed(file_format, full=False):
+    """
+    Write the product feed to ``get_feed_path(file_format)``, replacing the previous one atomically.
+    Products are rendered by segments of ``SEGMENT_SIZE`` consecutive ids kept next to the feed, and only
+    the segments whose products changed since the last run are rendered again (all of them with ``full``)
+    before the feed is stitched back together. Returns the number of rendered segments.
+    """
+    directory = get_segments_directory(file_format)
+    manifest_path = os.path.join(directory, 'manifest.json')
+    previous = {}
+    if not full and os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as file:
+            previous = json.load(file)
+
+    signatures = get_signatures()
+    changed = sorted((segment for segment in signatures if previous.get(segment) != signatures[segment]), key=int)
+    for segment in changed:
+        write_atomically(
+            get_segment_path(directory, segment), lambda file, part=segment: render_segment(file, file_format, part)
+        )
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        if name.endswith('.part') and name[:-len('.part')] not in signatures:
+            os.unlink(os.path.join(directory, name))
+
+    if changed or previous.keys() != signatures.keys() or not os.path.exists(get_feed_path(file_format)):
+        segments = sorted(signatures, key=int)
+        write_atomically(get_feed_path(file_format), lambda file: stitch(file, file_format, directory, segments))
+    write_atomically(manifest_path, lambda file: json.dump(signatures, file))
+    return len(changed)
+
+
+def get_segment_path(directory, segment):
+    return os.path.join(directory, f'{segment}.part')
+
+
+def stitch(file, file_format, directory, segments):
+    feed_settings = get_feed_settings()
+    if file_format == 'xml':
+        file.write(XML_HEADER.format(title=escape(feed_settings['TITLE']), site_url=escape(feed_settings['SITE_URL'])))
+    else:
+        csv.writer(file).writerow(CSV_COLUMNS)
+    for segment in segments:
+        with open(get_segment_path(directory, segment), encoding='utf-8', newline='') as part:
+            shutil.copyfileobj(part, file)
+    if file_format == 'xml':
+        file.write(XML_FOOTER)
+
+
+def render_segment(file, file_format, segment):
+    size = get_feed_settings()['SEGMENT_SIZE']
+    segment = int(segment)
+    queryset = Product.objects.filter(pk__gte=segment * size, pk__lt=(segment + 1) * size).annotate(
+        # Products without stock rows are not tracked and never run out, see `shop.models.Stock`
+        in_stock=ExpressionWrapper(
+            Exists(Stock.objects.filter(product=OuterRef('pk'), available__gt=0))
+            | ~Exists(Stock.objects.filter(product=OuterRef('pk'))),
+            output_field=BooleanField(),
+        ),
+    ).order_by('id').values_list(
+        'id', 'title', 'description', 'image', 'price', 'price_currency', 'brand__name', 'category__name', 'in_stock',
+    )
+    writer = csv.writer(file)
+    for row in queryset.iterator():
+        item = get_item(*row)
+        if file_format == 'xml':
+            file.write(render_xml_item(item))
+        else:
+            writer.writerow([item[column] for column in CSV_COLUMNS])
+
+
+def get_item(pk, title, description, image, price, price_currency, brand, category, in_stock):
+    feed_settings = get_feed_settings()
+    site_url = feed_settings['SITE_URL']
+    return {
+        'id': str(pk),
+        'title': title,
+        'description': description or title,
+        'link': feed_settings['PRODUCT_URL'].format(site_url=site_url, id=pk),
+        'image_link': urljoin(site_url + '/', default_storage.url(image)) if image else '',
+        'price': f'{price:.2f} {price_currency}',
+        'brand': brand,
+        'product_type': category,
+        'availability': 'in_stock' if in_stock else 'out_of_stock',
+        'condition': 'new',
+    }
+
+
+def render_xml_item(item):
+    buffer = StringIO()
+    buffer.write('<item>\n')
+    for column in CSV_COLUMNS:
+        if item[column]:
+            buffer.write(f'<g:{column}>{escape(item[column])}</g:{column}>\n')
+    buffer.write('</item>\n')
+    return buffer.getvalue()
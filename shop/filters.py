@@ -1,6 +1,9 @@
+from django_filters import CharFilter
 from django_filters.rest_framework import FilterSet
+from rest_framework.filters import SearchFilter
 
 from .models import Product
+from .search import search_products
 
 
 class ProductFilterSet(FilterSet):
@@ -12,3 +15,30 @@ class ProductFilterSet(FilterSet):
             'category_id': ['exact'],
             'price': ['gte', 'lte'],
         }
+
+
+class ProductNodeFilterSet(FilterSet):
+    search = CharFilter(method='filter_search')
+
+    class Meta:
+        model = Product
+        fields = {
+            'title': ['exact', 'icontains', 'istartswith'],
+            'description': ['exact', 'icontains'],
+            'category': ['exact'],
+            'category_id': ['exact'],
+            'category__name': ['exact'],
+            'color': ['exact'],
+            'brand_id': ['exact'],
+            'price': ['gte', 'lte'],
+        }
+
+    def filter_search(self, queryset, name, value):
+        return search_products(queryset, value)
+
+
+class ProductSearchFilter(SearchFilter):
+    """``?search=`` backed by the product full-text index instead of ``icontains`` scans"""
+
+    def filter_queryset(self, request, queryset, view):
+        return search_products(queryset, request.query_params.get(self.search_param, ''))
@@ -0,0 +1,190 @@
+from datetime import timedelta
+from hashlib import sha256
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from shoppy.lru import LRUCache
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+DEFAULTS = {
+    'TTL': 60 * 60 * 24,
+    # An unfinished request is assumed dead (its worker killed or timed out) after that long, and its key reclaimed
+    'LEASE': 60,
+    'MEMORY_SIZE': 4096,
+}
+
+# Claim a key in one statement: a new key, one whose previous request expired, or one whose previous request
+# never finished within its lease is (re)inserted with the token of the new request and returned
+CLAIM_SQL = '''
+    INSERT INTO {table} (key, fingerprint, created_at, token, status_code, content, content_type)
+    VALUES (%(key)s, %(fingerprint)s, %(now)s, %(token)s, NULL, NULL, '')
+    ON CONFLICT (key) DO UPDATE SET
+        fingerprint = EXCLUDED.fingerprint, created_at = EXCLUDED.created_at, token = EXCLUDED.token,
+        status_code = NULL, content = NULL, content_type = ''
+    WHERE {table}.created_at < %(expired_before)s
+        OR ({table}.status_code IS NULL AND {table}.created_at < %(lease_expired_before)s)
+    RETURNING key
+'''
+
+
+def get_idempotency_settings():
+    return {**DEFAULTS, **getattr(settings, 'SHOP_IDEMPOTENCY', {})}
+
+
+# Completed responses, so retries hitting the same process skip the database entirely
+memory = LRUCache(maxsize=get_idempotency_settings()['MEMORY_SIZE'], ttl=get_idempotency_settings()['TTL'])
+
+
+class Replay(Exception):
+    def __init__(self, entry):
+        super().__init__()
+        self.entry = entry
+
+
+class RequestInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = f'A request with the same {HEADER} is still in progress.'
+    default_code = 'idempotency_key_in_progress'
+
+
+class KeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = f'The {HEADER} was already used with a different request body.'
+    default_code = 'idempotency_key_reused'
+
+
+def get_expiry():
+    return timezone.now() - timedelta(seconds=get_idempotency_settings()['TTL'])
+
+
+def replay(entry):
+    response = HttpResponse(entry['content'], status=entry['status_code'], content_type=entry['content_type'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def claim(key, fingerprint, token):
+    """
+    Claim ``key`` for a new request identified by ``token`` and return ``None``, or return the stored outcome
+    of a previous one
+    """
+    entry = memory.get(key)
+    if entry is None:
+        now = timezone.now()
+        params = {
+            'key': key, 'fingerprint': fingerprint, 'token': token, 'now': now, 'expired_before': get_expiry(),
+            'lease_expired_before': now - timedelta(seconds=get_idempotency_settings()['LEASE']),
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(CLAIM_SQL.format(table=IdempotencyKey._meta.db_table), params)
+            if cursor.fetchone():
+                return None
+
+        stored = IdempotencyKey.objects.filter(key=key).first()
+        if stored is None:
+            # Purged in between, let the request through
+            return None
+        entry = {
+            'fingerprint': stored.fingerprint,
+            'status_code': stored.status_code,
+            'content': stored.content and bytes(stored.content),
+            'content_type': stored.content_type,
+        }
+        if stored.status_code is not None:
+            memory.set(key, entry)
+
+    if entry['fingerprint'] != fingerprint:
+        raise KeyReused()
+    if entry['status_code'] is None:
+        raise RequestInProgress()
+    return entry
+
+
+def release(key, token):
+    """Let the request holding ``key`` be retried, unless its claim was reclaimed by another request meanwhile"""
+    IdempotencyKey.objects.filter(key=key, token=token).delete()
+
+
+def store(key, fingerprint, token, response):
+    """
+    Store the outcome of the request that claimed ``key`` with ``token``; server errors release the key instead.
+    Nothing is stored once a retry reclaimed the key past its lease, the retry stores its own outcome instead.
+    """
+    if response.status_code >= 500:
+        release(key, token)
+        return
+
+    entry = {
+        'fingerprint': fingerprint,
+        'status_code': response.status_code,
+        'content': bytes(response.content),
+        'content_type': response['Content-Type'],
+    }
+    updated = IdempotencyKey.objects.filter(key=key, token=token).update(
+        status_code=entry['status_code'], content=entry['content'], content_type=entry['content_type'],
+    )
+    if updated:
+        memory.set(key, entry)
+
+
+def purge_expired_keys():
+    """Delete keys older than the TTL, returns the number of deleted keys"""
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=get_expiry()).delete()
+    return deleted
+
+
+class IdempotencyMixin:
+    """
+    Make the ``idempotent_actions`` of a viewset safe to retry: a request sent with an ``Idempotency-Key``
+    header runs once, and its retries get the stored response back without running the action again.
+    Keys are scoped to the user, method and path, and expire after ``SHOP_IDEMPOTENCY['TTL']`` seconds.
+    """
+    idempotent_actions = ('create',)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        value = request.headers.get(HEADER)
+        if not value or self.action not in self.idempotent_actions:
+            return
+        if len(value) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: [f'Ensure this value has at most {MAX_KEY_LENGTH} characters.']})
+
+        raw = '|'.join(map(str, [request.user.pk, request.method, request.path, value]))
+        key = sha256(raw.encode()).hexdigest()
+        fingerprint = sha256(request.body).hexdigest()
+        token = uuid4()
+        entry = claim(key, fingerprint, token)
+        if entry is not None:
+            raise Replay(entry)
+        request.idempotency_key = (key, fingerprint, token)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Replay):
+            return replay(exc.entry)
+
+        key = getattr(self.request, 'idempotency_key', None)
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            # Unhandled errors release the key so the request can be retried
+            if key is not None:
+                release(key[0], key[2])
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(request, 'idempotency_key', None)
+        if key is not None and isinstance(response, Response):
+            response.render()
+            store(*key, response)
+        return response
@@ -0,0 +1,138 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Threads generating the variants of uploaded images, 0 to generate them in the saving thread
+    'WORKERS': 2,
+    # Largest width and height of every variant, the aspect ratio is kept
+    'VARIANTS': {
+        'thumbnail': (160, 160),
+        'card': (480, 480),
+        'zoom': (1600, 1600),
+    },
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 82,
+}
+
+# Pillow plugin and file extension of every variant format
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+# Formats keeping transparency, transparent images are flattened onto white for the others
+ALPHA_FORMATS = {'webp'}
+
+executor = None
+executor_lock = Lock()
+
+
+def get_image_settings():
+    return {**DEFAULTS, **getattr(settings, 'SHOP_IMAGES', {})}
+
+
+def get_formats():
+    """The configured variant formats this Pillow build can write"""
+    return [name for name in get_image_settings()['FORMATS'] if name != 'webp' or features.check('webp')]
+
+
+def get_variant_name(name, variant, image_format):
+    """
+    Storage name of a variant, derived from the name of the original so its URL needs no lookup. The
+    extension of the original is kept, so ``photo.png`` and ``photo.jpg`` do not share their variants.
+    """
+    directory, file_name = os.path.split(name)
+    return os.path.join(directory, 'variants', f'{file_name}-{variant}.{FORMATS[image_format][1]}')
+
+
+def get_variant_urls(name):
+    """``{variant: {format: url}}`` of the image stored as ``name``"""
+    formats = get_formats()
+    return {
+        variant: {
+            image_format: default_storage.url(get_variant_name(name, variant, image_format)) for image_format in formats
+        }
+        for variant in get_image_settings()['VARIANTS']
+    }
+
+
+def has_variants(name):
+    image_settings = get_image_settings()
+    return all(
+        default_storage.exists(get_variant_name(name, variant, image_format))
+        for variant in image_settings['VARIANTS'] for image_format in get_formats()
+    )
+
+
+def generate_variants(name, force=False):
+    """
+    Write every variant of the image stored as ``name``, unless they all exist already (or ``force``).
+    Returns whether variants were written.
+    """
+    if not force and has_variants(name):
+        return False
+
+    image_settings = get_image_settings()
+    with default_storage.open(name) as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original = original.convert('RGBA' if has_transparency(original) else 'RGB')
+
+    for variant, size in image_settings['VARIANTS'].items():
+        image = original.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        for image_format in get_formats():
+            output = image if image.mode == 'RGB' or image_format in ALPHA_FORMATS else flatten(image)
+            buffer = BytesIO()
+            output.save(buffer, FORMATS[image_format][0], quality=image_settings['QUALITY'], optimize=True)
+            variant_name = get_variant_name(name, variant, image_format)
+            # Storages never overwrite, they pick another name instead
+            default_storage.delete(variant_name)
+            default_storage.save(variant_name, ContentFile(buffer.getvalue()))
+    return True
+
+
+def has_transparency(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+
+
+def flatten(image):
+    """An RGB copy of an RGBA image over a white background"""
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=get_image_settings()['WORKERS'], thread_name_prefix='shop-images',
+            )
+        return executor
+
+
+def schedule_variants(name):
+    """Generate the variants of ``name`` in the worker pool, so uploads do not wait for them"""
+    if not get_image_settings()['WORKERS']:
+        run_safely(name)
+        return
+    get_executor().submit(run_safely, name)
+
+
+def run_safely(name, force=False):
+    try:
+        return generate_variants(name, force=force)
+    except Exception:
+        # The original image is still served, see `ProductSerializer.get_images`
+        logger.exception('Could not generate the variants of %s', name)
+        return None
@@ -0,0 +1,95 @@
+from django.db import connection, transaction
+
+from .models import Stock
+
+# Take the requested quantities from the shards of every tracked product in one statement. Shards are
+# consumed in id order, each giving at most what is left to take after the previous ones, and nothing
+# is updated unless every product has enough units in the shards this statement could lock.
+RESERVE_SQL = '''
+    WITH wanted AS (
+        SELECT product_id, quantity
+        FROM unnest(%(product_ids)s::bigint[], %(quantities)s::integer[]) AS wanted (product_id, quantity)
+        WHERE EXISTS (SELECT 1 FROM {stock} stock WHERE stock.product_id = wanted.product_id)
+    ), locked AS MATERIALIZED (
+        SELECT stock.id, stock.product_id, stock.available FROM {stock} stock
+        WHERE stock.product_id IN (SELECT product_id FROM wanted) AND stock.available > 0
+        ORDER BY stock.id
+        FOR UPDATE {lock}
+    ), plan AS (
+        SELECT locked.id, locked.product_id, wanted.quantity, GREATEST(LEAST(
+            locked.available,
+            wanted.quantity - coalesce(sum(locked.available) OVER (
+                PARTITION BY locked.product_id ORDER BY locked.id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+            ), 0)
+        ), 0) AS take
+        FROM locked JOIN wanted USING (product_id)
+    ), short AS (
+        SELECT wanted.product_id FROM wanted LEFT JOIN plan USING (product_id)
+        GROUP BY wanted.product_id, wanted.quantity
+        HAVING coalesce(sum(plan.take), 0) < wanted.quantity
+    ), stored AS (
+        SELECT product_id, sum(available) AS available FROM {stock}
+        WHERE product_id IN (SELECT product_id FROM short) GROUP BY product_id
+    ), reserved AS (
+        UPDATE {stock} stock SET available = stock.available - plan.take
+        FROM plan WHERE stock.id = plan.id AND plan.take > 0 AND NOT EXISTS (SELECT 1 FROM short)
+    )
+    SELECT short.product_id, coalesce(stored.available, 0) < wanted.quantity
+    FROM short JOIN wanted USING (product_id) LEFT JOIN stored USING (product_id)
+    ORDER BY short.product_id
+'''
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f'Not enough stock for products: {", ".join(map(str, product_ids))}')
+        self.product_ids = product_ids
+
+
+class ShardsBusy(Exception):
+    pass
+
+
+def set_stock(product, available, shards=1):
+    """Replace the stock of ``product`` by ``available`` units spread evenly over ``shards`` rows"""
+    with transaction.atomic():
+        Stock.objects.filter(product=product).delete()
+        Stock.objects.bulk_create([
+            Stock(product=product, shard=shard, available=available // shards + (shard < available % shards))
+            for shard in range(shards)
+        ])
+
+
+def reserve_stock(items):
+    """
+    Take ``{product_id: quantity}`` out of the stock of the tracked products, all or nothing, raising
+    ``OutOfStock`` otherwise. Must be called in a transaction: the units are given back if it rolls back.
+
+    Shards locked by concurrent checkouts are skipped first, so checkouts of a hot product only wait
+    on each other when the free shards do not hold enough units but all shards might. The skipping attempt
+    runs in a savepoint which releases its row locks before the blocking attempt locks the shards in id order.
+    """
+    if not items:
+        return
+    try:
+        with transaction.atomic():
+            short = execute_reservation(items, skip_locked=True)
+            if not all(exhausted for product_id, exhausted in short):
+                raise ShardsBusy
+            if short:
+                raise OutOfStock([product_id for product_id, exhausted in short])
+    except ShardsBusy:
+        short = execute_reservation(items, skip_locked=False)
+        if short:
+            raise OutOfStock([product_id for product_id, exhausted in short])
+
+
+def execute_reservation(items, skip_locked):
+    """
+    Run the reservation statement, returning the ``(product_id, exhausted)`` of the products that could
+    not be reserved, where ``exhausted`` tells whether all their shards together lack the units as well
+    """
+    sql = RESERVE_SQL.format(stock=Stock._meta.db_table, lock='SKIP LOCKED' if skip_locked else '')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'product_ids': list(items), 'quantities': list(items.values())})
+        return cursor.fetchall()
@@ -0,0 +1,151 @@
+from collections import defaultdict
+from collections.abc import Sequence
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.settings import graphene_settings
+from graphql_relay.connection.arrayconnection import get_offset_with_default
+from promise import Promise
+from promise.dataloader import DataLoader
+
+
+def get_loader(context, key, create):
+    """
+    The loader of the current request (the GraphQL context) registered under ``key``, created by ``create()``
+    on first use, so every resolver of a query shares it and their loads are batched together
+    """
+    if context is None:
+        return create()
+    loaders = context.__dict__.setdefault('graphql_loaders', {})
+    if key not in loaders:
+        loaders[key] = create()
+    return loaders[key]
+
+
+def load_object(info, model, pk):
+    """Load a ``model`` object by primary key, batched with the other loads of the query"""
+    if pk is None:
+        return None
+    return get_loader(info.context, (ModelLoader, model), lambda: ModelLoader(model)).load(pk)
+
+
+def get_order_by(ordering):
+    if hasattr(ordering, 'resolve_expression'):
+        return ordering
+    return F(ordering[1:]).desc() if ordering.startswith('-') else F(ordering).asc()
+
+
+class ModelLoader(DataLoader):
+    """Load objects of ``model`` by primary key, in one query per batch"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def batch_load_fn(self, keys):
+        objects = self.model._default_manager.in_bulk(keys)
+        return Promise.resolve([objects.get(key) for key in keys])
+
+
+class RelatedPage(Sequence):
+    """
+    A list of ``length`` objects of which only ``objects``, starting at ``offset``, are loaded: enough for
+    ``resolve_connection`` to slice the requested page from, and to tell whether there are pages around it
+    """
+
+    def __init__(self, objects, offset, length):
+        self.objects = objects
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self.objects[index - self.offset]
+        start, stop, _ = index.indices(self.length)
+        objects = self.objects[max(start - self.offset, 0):max(stop - self.offset, 0)]
+        return RelatedPage(objects, max(self.offset - start, 0), max(stop - start, 0))
+
+
+class RelatedPageLoader(DataLoader):
+    """
+    Load a page of the objects of ``queryset`` related to each parent through the ``field`` foreign key, for a
+    batch of parents in a single query ranking them by parent. Pages start at the ``start`` offset and end at
+    the ``end`` one (at the last object when ``None``), or are the ``last`` objects before ``end``.
+    """
+
+    def __init__(self, queryset, field, start, end, last=None):
+        super().__init__()
+        self.queryset = queryset
+        self.field = field
+        self.start = start
+        self.end = end
+        self.last = last
+
+    def batch_load_fn(self, keys):
+        queryset = self.queryset.filter(**{f'{self.field}__in': keys})
+        ordering = queryset.query.order_by or queryset.model._meta.ordering or ['pk']
+        queryset = queryset.annotate(
+            page_row=Window(
+                RowNumber(), partition_by=F(self.field), order_by=[get_order_by(name) for name in ordering],
+            ),
+            page_total=Window(Count('pk'), partition_by=F(self.field)),
+        )
+        # Window functions cannot be filtered on before Django 4.2, rank in a subquery instead. `LEAST` and
+        # `GREATEST` ignore the missing bounds.
+        sql, params = queryset.query.sql_with_params()
+        ranked = queryset.model._default_manager.raw(
+            f'''SELECT * FROM ({sql}) page
+            WHERE page_row <= LEAST(page_total, %s) AND page_row > GREATEST(%s, LEAST(page_total, %s) - %s)''',
+            (*params, self.end, self.start, self.end, self.last),
+        )
+
+        by_parent = defaultdict(list)
+        for obj in sorted(ranked, key=lambda obj: obj.page_row):
+            by_parent[getattr(obj, f'{self.field}_id')].append(obj)
+        return Promise.resolve([self.get_page(by_parent[key]) for key in keys])
+
+    def get_page(self, objects):
+        if not objects:
+            # Past the last object, or an empty page
+            return RelatedPage([], self.start, self.start)
+        return RelatedPage(objects, objects[0].page_row - 1, objects[0].page_total)
+
+
+class BatchedFilterConnectionField(DjangoFilterConnectionField):
+    """
+    A connection over a reverse foreign key (such as ``Brand.products``) whose pages are loaded for all the
+    parents of a query at once by a `RelatedPageLoader`, rather than with a count and a page query per parent.
+    Arguments are handled as by ``DjangoFilterConnectionField``.
+    """
+
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, filtering_args, filterset_class):
+        manager = iterable
+        queryset = super().resolve_queryset(
+            connection, manager.model._default_manager.all(), info, args, filtering_args, filterset_class,
+        )
+
+        # The rows of the requested page, see `resolve_connection`: `last` ones are counted back from its end
+        start = get_offset_with_default(args.get('after'), -1) + 1 + (args.get('offset') or 0)
+        first = args.get('first')
+        if first is None and 'last' not in args:
+            first = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        ends = [start + first] if first is not None else []
+        if 'before' in args:
+            ends.append(get_offset_with_default(args['before'], 0))
+        end = min(ends, default=None)
+
+        # Siblings resolving the same field with the same arguments share a loader
+        key = (RelatedPageLoader, info.parent_type.name, info.field_name, repr(sorted(args.items())))
+        loader = get_loader(
+            info.context, key,
+            lambda: RelatedPageLoader(queryset, manager.field.name, start, end, args.get('last')),
+        )
+        return loader.load(manager.instance.pk)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from shop.cart_lifecycle import get_cart_storage_stats
+
+
+class Command(BaseCommand):
+    help = 'Report the size of the cart tables and how many carts are idle'
+
+    def handle(self, *args, **options):
+        stats = get_cart_storage_stats()
+        for name, table in stats['tables'].items():
+            self.stdout.write(
+                f'{name}: ~{table["rows"]} rows, table {filesizeformat(table["table_size"])}, '
+                f'indexes {filesizeformat(table["indexes_size"])}, total {filesizeformat(table["total_size"])}'
+            )
+        self.stdout.write(f'{stats["idle_carts"]} carts are idle and will be deleted by reap_idle_carts')
@@ -0,0 +1,119 @@
+import re
+import sys
+from collections import Counter
+from contextlib import nullcontext
+from urllib.parse import urlsplit, parse_qsl
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from shop.models import Product
+
+REQUEST_PATTERN = re.compile(r'(?:GET|HEAD) (?P<target>\S+)')
+EQUALITY_PARAMS = ('color', 'brand_id', 'category_id')
+RANGE_PARAMS = {'price__gte': 'price', 'price__lte': 'price'}
+DEFAULT_ORDERING = 'id'
+
+COVERED, PARTIAL, UNCOVERED = 'covered', 'partial', 'uncovered'
+
+
+def parse_request(target):
+    """Return the equality filters, range column and ordering column of a product list request"""
+    params = {key: value for key, value in parse_qsl(urlsplit(target).query) if value}
+    equality = {param: params[param] for param in EQUALITY_PARAMS if param in params}
+    range_column = next((column for param, column in RANGE_PARAMS.items() if param in params), None)
+    ordering = params.get('ordering', '').split(',')[0].lstrip('-')
+    return equality, range_column, ordering if ordering == 'price' else DEFAULT_ORDERING
+
+
+def condition_holds(condition, values):
+    """Whether equality ``values`` imply a (simple) partial index ``condition``"""
+    results = []
+    for child in condition.children:
+        if isinstance(child, Q):
+            results.append(condition_holds(child, values))
+        else:
+            field, expected = child
+            if field not in values:
+                return False
+            results.append(values[field] == str(expected))
+    result = all(results) if condition.connector == Q.AND else any(results)
+    return not result if condition.negated else result
+
+
+def get_btree_indexes():
+    """Return ``(name, columns, condition)`` of every B-tree index on the product table"""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, Product._meta.db_table)
+    conditions = {index.name: index.condition for index in Product._meta.indexes if index.condition}
+
+    return [
+        (name, info['columns'], conditions.get(name))
+        for name, info in constraints.items()
+        if info['primary_key'] or info['unique'] or info.get('type') == 'idx'
+    ]
+
+
+def get_coverage(equality, range_column, ordering, indexes):
+    """
+    An index covers a request when its leading columns are exactly the equality filters,
+    followed by the range column (or, without a range filter, the ordering column).
+    It partially covers it when only the equality filters can use it.
+    """
+    best = (UNCOVERED, None)
+    wanted = range_column or ordering
+    for name, columns, condition in indexes:
+        if condition is not None and not condition_holds(condition, equality):
+            continue
+        if set(columns[:len(equality)]) != set(equality):
+            continue
+        if columns[len(equality):len(equality) + 1] == [wanted]:
+            return COVERED, name
+        if equality and best[0] == UNCOVERED:
+            best = (PARTIAL, name)
+    return best
+
+
+def describe(equality, range_column, ordering):
+    parts = list(equality)
+    if range_column:
+        parts.append(f'{range_column} range')
+    return ' + '.join(parts + [f'order by {ordering}'])
+
+
+class Command(BaseCommand):
+    help = 'Report which product filter/ordering combinations seen in access logs are not covered by an index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('logs', nargs='+', help='Access log files, `-` reads from stdin')
+        parser.add_argument('--path', default='/api/shop/products/', help='Path of the product list endpoint')
+        parser.add_argument('--uncovered-only', action='store_true', help='Hide fully covered combinations')
+
+    def handle(self, *args, **options):
+        indexes = get_btree_indexes()
+        report = Counter()
+
+        for name in options['logs']:
+            with nullcontext(sys.stdin) if name == '-' else open(name, encoding='utf-8', errors='replace') as log:
+                for line in log:
+                    match = REQUEST_PATTERN.search(line)
+                    if not match or urlsplit(match['target']).path != options['path']:
+                        continue
+                    if 'search=' in match['target']:
+                        # Searches are served by the full-text GIN index and ordered by rank
+                        continue
+                    equality, range_column, ordering = parse_request(match['target'])
+                    status, index = get_coverage(equality, range_column, ordering, indexes)
+                    report[(describe(equality, range_column, ordering), status, index)] += 1
+
+        uncovered = 0
+        for (combination, status, index), count in report.most_common():
+            if status != COVERED:
+                uncovered += count
+            elif options['uncovered_only']:
+                continue
+            self.stdout.write(f'{count:>8}  {status:<9}  {combination}  [{index or "-"}]')
+
+        total = sum(report.values())
+        self.stdout.write(f'{uncovered} of {total} catalog requests are not fully covered by an index')
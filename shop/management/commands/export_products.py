@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from shop.catalog import FORMATS, export_products
+
+
+class Command(BaseCommand):
+    help = 'Export every product as CSV or JSON Lines, in the format read by import_products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write, the standard output by default')
+        parser.add_argument('--since', help='Only export the products modified since this ISO 8601 date and time')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('--since is not a valid ISO 8601 date and time')
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        lines = export_products(options['format'], since=since)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+                file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
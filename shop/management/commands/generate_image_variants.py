@@ -0,0 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from shop.images import get_image_settings, run_safely
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generate the missing variants of every product image, in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Generate the variants again even if they exist')
+        parser.add_argument('--workers', type=int, help='Parallel workers, SHOP_IMAGES["WORKERS"] by default')
+
+    def handle(self, *args, **options):
+        names = Product.objects.exclude(image='').exclude(image__isnull=True).order_by().values_list(
+            'image', flat=True,
+        ).distinct().iterator()
+        workers = options['workers'] or get_image_settings()['WORKERS'] or 1
+
+        results = {True: 0, False: 0, None: 0}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(lambda name: run_safely(name, force=options['force']), names):
+                results[result] += 1
+
+        self.stdout.write(
+            f'Generated the variants of {results[True]} images, {results[False]} were up to date '
+            f'and {results[None]} failed'
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from shop.feeds import FORMATS, generate_feed, get_feed_path
+
+
+class Command(BaseCommand):
+    help = 'Write the product feed under MEDIA_ROOT, rendering again only the segments with changed products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, action='append', help='Feed format, all of them by default')
+        parser.add_argument('--full', action='store_true', help='Render every segment again')
+
+    def handle(self, *args, **options):
+        for file_format in options['format'] or FORMATS:
+            rendered = generate_feed(file_format, full=options['full'])
+            self.stdout.write(f'Wrote {get_feed_path(file_format)}, {rendered} segments rendered')
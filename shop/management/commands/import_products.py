@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog import FORMATS, DEFAULT_BATCH_SIZE, guess_format, read_rows, import_products
+
+
+class Command(BaseCommand):
+    help = 'Create or update products from a CSV or JSON Lines file, reporting the rows that could not be imported'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header line) or JSON Lines file')
+        parser.add_argument('--format', choices=FORMATS, help='Format of the file, guessed from its extension')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows written per transaction')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or guess_format(options['path'])
+        if file_format is None:
+            raise CommandError('Cannot guess the format of the file, use --format')
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as file:
+            result = import_products(read_rows(file, file_format), batch_size=options['batch_size'])
+
+        for error in result['errors']:
+            messages = '; '.join(
+                f'{field}: {" ".join(map(str, detail))}' for field, detail in error['errors'].items()
+            )
+            self.stderr.write(f'line {error["line"]}: {messages}')
+        self.stdout.write(
+            f'Created {result["created"]} and updated {result["updated"]} products, '
+            f'{len(result["errors"])} rows were rejected'
+        )
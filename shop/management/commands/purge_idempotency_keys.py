@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from shop.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than SHOP_IDEMPOTENCY["TTL"]'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Deleted {purge_expired_keys()} expired idempotency keys')
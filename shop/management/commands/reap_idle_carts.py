@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.cart_lifecycle import get_cart_settings, reap_idle_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete the carts left unchanged for SHOP_CARTS["IDLE_TTL"] seconds, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, help='Delete carts idle for that many days instead')
+        parser.add_argument('--batch-size', type=int, help='Carts deleted per statement')
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        idle_before = None
+        if options['days'] is not None:
+            idle_before = timezone.now() - timedelta(days=options['days'])
+        carts, items = reap_idle_carts(
+            idle_before=idle_before,
+            batch_size=options['batch_size'] or get_cart_settings()['REAP_BATCH_SIZE'],
+            pause=options['pause'],
+        )
+        self.stdout.write(f'Deleted {carts} idle carts and {items} cart items')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from shop.carts import drifted_carts, recalculate_cart_totals
+from shop.models import Cart
+
+
+class Command(BaseCommand):
+    help = 'Report carts whose stored totals drifted from their items, and optionally recalculate them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Recalculate the totals of drifted carts')
+
+    def handle(self, *args, **options):
+        drifted = list(drifted_carts(Cart.objects.all()).values_list(
+            'pk', 'item_count', 'expected_item_count', 'total_price', 'expected_total_price',
+        ))
+        for pk, item_count, expected_item_count, total_price, expected_total_price in drifted:
+            self.stdout.write(
+                f'{pk}  items: {item_count} (expected {expected_item_count})  '
+                f'total: {total_price} (expected {expected_total_price})'
+            )
+
+        if options['fix'] and drifted:
+            fixed = recalculate_cart_totals(Cart.objects.filter(pk__in=[row[0] for row in drifted]))
+            self.stdout.write(f'Recalculated the totals of {fixed} carts')
+        else:
+            self.stdout.write(f'{len(drifted)} carts have drifted totals')
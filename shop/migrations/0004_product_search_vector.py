@@ -0,0 +1,49 @@
+# Generated by Django 4.0.2 on 2026-10-18 16:52
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('simple', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce({row}description, '')), 'B')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_alter_product_options_orderitem_unit_price_currency_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='shop_product_search_idx'),
+        ),
+        migrations.RunSQL(
+            sql=f"""
+                CREATE FUNCTION shop_product_search_vector_trigger() RETURNS trigger AS $$
+                BEGIN
+                    NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.')};
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql;
+
+                CREATE TRIGGER shop_product_search_vector_update
+                    BEFORE INSERT OR UPDATE OF title, description, search_vector ON shop_product
+                    FOR EACH ROW EXECUTE FUNCTION shop_product_search_vector_trigger();
+
+                UPDATE shop_product SET search_vector = {SEARCH_VECTOR_SQL.format(row='')};
+            """,
+            reverse_sql="""
+                DROP TRIGGER shop_product_search_vector_update ON shop_product;
+                DROP FUNCTION shop_product_search_vector_trigger();
+            """,
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.2 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('status_code', models.PositiveSmallIntegerField(null=True)),
+                ('content', models.BinaryField(null=True)),
+                ('content_type', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.0.2 on 2026-10-18 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_order_total_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_title',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE shop_orderitem SET product_title = product.title
+                FROM shop_product product WHERE product.id = shop_orderitem.product_id;
+                UPDATE shop_order SET item_count = coalesce(
+                    (SELECT sum(quantity) FROM shop_orderitem WHERE order_id = shop_order.id), 0
+                );
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
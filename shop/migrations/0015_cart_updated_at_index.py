@@ -0,0 +1,17 @@
+# Generated by Django 4.0.2 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_product_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['updated_at'], name='shop_cart_updated_at'),
+        ),
+    ]
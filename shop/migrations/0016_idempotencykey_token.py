@@ -0,0 +1,18 @@
+# Generated by Django 4.0.2 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_cart_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='token',
+            field=models.UUIDField(null=True),
+        ),
+    ]
@@ -1,8 +1,11 @@
 from uuid import uuid4
 
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Q
 from djmoney.models.fields import MoneyField
 
 User = get_user_model()
@@ -10,6 +13,12 @@ User = get_user_model()
 
 class Brand(models.Model):
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='shop_brand_name_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -17,6 +26,12 @@ class Brand(models.Model):
 
 class Category(models.Model):
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='shop_category_name_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -43,17 +58,85 @@ class Product(models.Model):
     size = models.CharField(max_length=255, choices=Sizes.choices, default=Sizes.NONE)
     brand = models.ForeignKey(Brand, on_delete=models.PROTECT, related_name='products')
     category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='products')
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by the `shop_product_search_vector_update` database trigger, see `shop.search`
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='shop_product_search_idx'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='shop_product_title_trgm_idx'),
+            # Filter + ordering combinations of `ProductFilterSet`, see the `catalog_index_report` command
+            models.Index(fields=['category', 'price'], name='shop_product_category_price'),
+            models.Index(fields=['category', 'id'], name='shop_product_category_id'),
+            models.Index(fields=['brand', 'color', 'price'], name='shop_product_brand_color_price'),
+            models.Index(fields=['brand', 'id'], name='shop_product_brand_id'),
+            models.Index(fields=['color', 'price'], name='shop_product_color_price', condition=~Q(color='none')),
+            models.Index(fields=['price', 'id'], name='shop_product_price_id'),
+            # Incremental exports, see `shop.catalog.export_products`
+            models.Index(fields=['updated_at'], name='shop_product_updated_at'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Compared on saving, so carts are only recalculated when the price changes and image variants only
+        # generated for a new image (see `shop.signals`)
+        loaded = dict(zip(field_names, values))
+        if loaded.get('price', models.DEFERRED) is not models.DEFERRED and \
+                loaded.get('price_currency', models.DEFERRED) is not models.DEFERRED:
+            instance._loaded_price = (loaded['price'], loaded['price_currency'])
+        if loaded.get('image', models.DEFERRED) is not models.DEFERRED:
+            instance._loaded_image = loaded['image'] or ''
+        return instance
+
+    def get_price_key(self):
+        return self.price.amount, str(self.price.currency)
+
+    def has_price_changed(self):
+        """Whether the price differs from the one loaded or last saved, ``True`` when it is not known"""
+        return getattr(self, '_loaded_price', None) != self.get_price_key()
+
+    def has_image_changed(self):
+        """Whether the image differs from the one loaded or last saved, ``True`` when it is not known"""
+        return getattr(self, '_loaded_image', None) != (self.image.name or '')
+
+
+class Stock(models.Model):
+    """
+    Available units of a product (every color/size variant is its own product), split over one or more
+    shards so concurrent checkouts of a hot product lock different rows, see `shop.inventory`.
+    Products without stock rows are not tracked and never run out.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock')
+    shard = models.PositiveSmallIntegerField(default=0)
+    available = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('product', 'shard')]
+
+    def __str__(self):
+        return f'{self.product} #{self.shard}: {self.available}'
+
 
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also touched whenever one of its items changes
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained incrementally by `shop.carts`, in the currency of the first item added
+    item_count = models.PositiveIntegerField(default=0)
+    total_price = MoneyField(max_digits=14, decimal_places=2, default=0, default_currency='IRR')
+
+    class Meta:
+        indexes = [
+            # Idle carts are deleted by `shop.cart_lifecycle.reap_idle_carts`
+            models.Index(fields=['updated_at'], name='shop_cart_updated_at'),
+        ]
 
 
 class CartItem(models.Model):
@@ -75,8 +158,22 @@ class Order(models.Model):
         DELIVERED = ('delivered', 'Delivered')
 
     placed_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=255, choices=Status.choices, default=Status.PREPARING)
     user = models.ForeignKey(User, on_delete=models.PROTECT, related_name='orders')
+    # Set at checkout: the sum of `unit_price * quantity` of the items in the currency of the first one,
+    # and the number of units ordered
+    total_price = MoneyField(max_digits=14, decimal_places=2, default=0, default_currency='IRR')
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Order history of a customer, newest first
+            models.Index(fields=['user', '-id'], name='shop_order_user_id'),
+            # Changed orders and the days they were placed on, for the sales rollups, see `reports.rollups`
+            models.Index(fields=['updated_at'], name='shop_order_updated_at'),
+            models.Index(fields=['placed_at'], name='shop_order_placed_at'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -84,3 +181,20 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='orderitems')
     quantity = models.PositiveSmallIntegerField(validators=[MinValueValidator(1)])
     unit_price = MoneyField(max_digits=14, decimal_places=2, default_currency='IRR')
+    # Snapshot taken at checkout, so the order reads as it was placed
+    product_title = models.CharField(max_length=255, default='')
+
+
+class IdempotencyKey(models.Model):
+    """Outcome of a request sent with an ``Idempotency-Key`` header, replayed to its retries, see `shop.idempotency`"""
+    # sha256 of the user, method, path and header value
+    key = models.CharField(max_length=64, primary_key=True)
+    # sha256 of the request body, a retry must send the same one
+    fingerprint = models.CharField(max_length=64)
+    created_at = models.DateTimeField(db_index=True)
+    # Drawn by the request holding the key, whose outcome is only stored while it still holds it
+    token = models.UUIDField(null=True)
+    # Empty until the first request completes
+    status_code = models.PositiveSmallIntegerField(null=True)
+    content = models.BinaryField(null=True)
+    content_type = models.CharField(max_length=255, blank=True)
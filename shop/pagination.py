@@ -1,5 +1,215 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+import math
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 10
+
+
+def estimate_count(queryset):
+    """Return the planner's row estimate for ``queryset`` instead of running a ``COUNT(*)``"""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate on the values of the last row seen instead of an offset, so deep pages cost the same
+    as the first one and no ``COUNT(*)`` is issued. Orders by the view's ``ordering`` query param
+    when it is one of its ``ordering_fields``, otherwise by ``ordering``; the primary key is always
+    appended as a tie-breaker.
+    """
+    page_size = 10
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering = '-id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering_fields = self.get_ordering(request, view)
+        self.count = estimate_count(queryset) if self.wants_approximate_count(request) else None
+
+        position, reverse = self.decode_cursor(request)
+        ordering = [self.reverse_field(field) for field in self.ordering_fields] if reverse else self.ordering_fields
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.get_position_filter(ordering, position))
+            except (TypeError, ValueError, OverflowError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+            response.move_to_end('count', last=False)
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to `approximate` to include an estimated total count.',
+                'schema': {'type': 'string', 'enum': ['approximate']},
+            },
+        ]
+
+    def get_ordering(self, request, view):
+        fields = getattr(view, 'ordering_fields', None) or ()
+        param = request.query_params.get('ordering', '').split(',')[0].strip()
+        field = param if param.lstrip('-') in fields else self.ordering
+        pk = '-pk' if field.startswith('-') else 'pk'
+        return [field] if field.lstrip('-') in ('id', 'pk') else [field, pk]
+
+    def wants_approximate_count(self, request):
+        return request.query_params.get(self.count_query_param) == 'approximate'
+
+    @staticmethod
+    def reject_constant(name):
+        raise ValueError(f'{name} is not a valid cursor value')
+
+    @staticmethod
+    def reverse_field(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def get_position_filter(ordering, position):
+        """Build ``(a > x) OR (a = x AND b > y)`` for the (possibly descending) ``ordering``"""
+        condition = None
+        for field, value in reversed(list(zip(ordering, position))):
+            name = field.lstrip('-')
+            beyond = Q(**{f'{name}__{"lt" if field.startswith("-") else "gt"}': value})
+            condition = beyond if condition is None else beyond | (Q(**{name: value}) & condition)
+        return condition
+
+    def get_position(self, instance):
+        position = []
+        for field in self.ordering_fields:
+            value = getattr(instance, field.lstrip('-'))
+            value = getattr(value, 'amount', value)
+            position.append(str(value) if isinstance(value, Decimal) else value)
+        return position
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        cursor = urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()).decode(), parse_constant=self.reject_constant)
+            position, reverse = payload['p'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering_fields):
+            raise NotFound(self.invalid_cursor_message)
+        # Numbers too large for a float, such as 1e400, are parsed as infinity
+        if any(isinstance(value, float) and not math.isfinite(value) for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+
+class CatalogPagination(DefaultPagination):
+    """
+    Page number pagination that switches to ``KeysetPagination`` when ``?pagination=cursor``
+    is requested or a cursor is given
+    """
+    mode_query_param = 'pagination'
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.wants_keyset(request):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to `cursor` to paginate with cursors instead of page numbers.',
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+            *self.keyset_pagination_class().get_schema_operation_parameters(view),
+        ]
+
+    def wants_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.keyset_pagination_class.cursor_query_param in request.query_params
+        )
@@ -2,6 +2,8 @@ from graphene import Node
 from graphene_django.filter import DjangoFilterConnectionField
 from graphene_django.types import DjangoObjectType
 
+from .filters import ProductNodeFilterSet
+from .loaders import BatchedFilterConnectionField, load_object
 from .models import Category, Brand, Product
 
 
@@ -12,6 +14,8 @@ class BrandNode(DjangoObjectType):
         fields = '__all__'
         filter_fields = ['name']
 
+    products = BatchedFilterConnectionField('shop.schema.ProductNode')
+
 
 class CategoryNode(DjangoObjectType):
     class Meta:
@@ -20,23 +24,26 @@ class CategoryNode(DjangoObjectType):
         fields = '__all__'
         filter_fields = ['name']
 
+    products = BatchedFilterConnectionField('shop.schema.ProductNode')
+
 
 class ProductNode(DjangoObjectType):
     class Meta:
         model = Product
         # Allow for some more advanced filtering here
         interfaces = (Node,)
-        fields = '__all__'
-        filter_fields = {
-            'title': ['exact', 'icontains', 'istartswith'],
-            'description': ['exact', 'icontains'],
-            'category': ['exact'],
-            'category_id': ['exact'],
-            'category__name': ['exact'],
-            'color': ['exact'],
-            'brand_id': ['exact'],
-            'price': ['gte', 'lte'],
-        }
+        exclude = ('search_vector',)
+        filterset_class = ProductNodeFilterSet
+
+    # Foreign keys are loaded in one query for all the products of a query, see `shop.loaders`
+
+    @staticmethod
+    def resolve_brand(product, info):
+        return load_object(info, Brand, product.brand_id)
+
+    @staticmethod
+    def resolve_category(product, info):
+        return load_object(info, Category, product.category_id)
 
 
 class Query(object):
@@ -0,0 +1,28 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+# Must match the configuration used by the `shop_product_search_vector_trigger` database function
+SEARCH_CONFIG = 'simple'
+
+
+def build_search_query(text):
+    """
+    Turn free text into a tsquery matching every term as a prefix, so ``"blu sh"`` finds
+    "Blue shirt" while the user is still typing. Returns ``None`` when there is nothing to search.
+    """
+    terms = re.findall(r'\w+', text.lower())
+    if not terms:
+        return None
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_products(queryset, text):
+    """Filter products matching ``text`` through the ``search_vector`` GIN index, most relevant first"""
+    query = build_search_query(text)
+    if query is None:
+        return queryset
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F('search_vector'), query),
+    ).order_by('-search_rank', '-id')
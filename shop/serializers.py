@@ -1,7 +1,14 @@
 from django.contrib.auth import get_user_model
-from django.db import transaction
 from rest_framework import serializers
-
+from rest_framework.exceptions import NotFound
+
+from .cart_store import get_cart_store
+from .carts import (
+    add_cart_item, CartNotFound, ProductNotFound, QuantityTooLarge, BULK_OPERATIONS, MAX_QUANTITY, REMOVE,
+)
+from .checkout import place_order, EmptyCart
+from .images import get_variant_urls
+from .inventory import OutOfStock
 from .models import Product, Brand, Category, CartItem, Cart, OrderItem, Order
 
 User = get_user_model()
@@ -22,11 +29,20 @@ class CategorySerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     brand = BrandSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         read_only_fields = ('id', 'brand', 'category')
-        fields = ('id', 'title', 'description', 'price', 'price_currency', 'size', 'color', 'brand', 'category',)
+        fields = (
+            'id', 'title', 'description', 'price', 'price_currency', 'size', 'color', 'brand', 'category', 'images',
+        )
+
+    def get_images(self, product: Product):
+        # Variant URLs are derived from the image name, see `shop.images`
+        if not product.image:
+            return None
+        return {'original': product.image.url, **get_variant_urls(product.image.name)}
 
 
 class SimpleProductSerializer(serializers.ModelSerializer):
@@ -44,7 +60,7 @@ class CreateProductSerializer(ProductSerializer):
         model = Product
         read_only_fields = ('id', 'brand', 'category')
         fields = (
-            'id', 'title', 'description', 'price', 'price_currency', 'size', 'color', 'brand', 'category',
+            'id', 'title', 'description', 'price', 'price_currency', 'size', 'color', 'brand', 'category', 'images',
             'brand_id', 'category_id',
         )
 
@@ -80,65 +96,70 @@ class UpdateProductSerializer(serializers.ModelSerializer):
         fields = ('title', 'description', 'price', 'price_currency', 'size', 'color',)
 
 
+class ProductImportSerializer(serializers.ModelSerializer):
+    """One row of a catalog import, see `shop.catalog`; rows with an ``id`` update that product"""
+    id = serializers.IntegerField(required=False, min_value=1)
+    brand = serializers.CharField(max_length=255)
+    category = serializers.CharField(max_length=255)
+
+    class Meta:
+        model = Product
+        fields = ('id', 'title', 'description', 'price', 'price_currency', 'size', 'color', 'brand', 'category',)
+
+
+# noinspection PyAbstractClass
+class ProductExportQuerySerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=('jsonl', 'csv'), default='jsonl')
+    since = serializers.DateTimeField(required=False)
+
+
 class CartItemSerializer(serializers.ModelSerializer):
     product = SimpleProductSerializer()
-    price_currency = serializers.SerializerMethodField()
-    total_price = serializers.SerializerMethodField()
+    price_currency = serializers.CharField(source='product.price_currency', read_only=True)
+    # Annotated by the database, see `shop.carts.line_total`
+    total_price = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
 
     class Meta:
         model = CartItem
         read_only_fields = ('id',)
         fields = ('id', 'product', 'quantity', 'price_currency', 'total_price',)
 
-    def get_price_currency(self, cart_item: CartItem):
-        return str(cart_item.product.price.currency)
-
-    def get_total_price(self, cart_item: CartItem):
-        total = cart_item.quantity * cart_item.product.price
-        return total.amount
-
 
 class CartSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     items = CartItemSerializer(many=True, read_only=True)
-    price_currency = serializers.SerializerMethodField()
-    total_price = serializers.SerializerMethodField()
+    price_currency = serializers.CharField(source='total_price_currency', read_only=True)
+    total_price = serializers.DecimalField(source='total_price.amount', max_digits=14, decimal_places=2, read_only=True)
 
     class Meta:
         model = Cart
         read_only_fields = ('id',)
-        fields = ('id', 'items', 'price_currency', 'total_price',)
-
-    def get_price_currency(self, cart: Cart):
-        for item in cart.items.all():
-            return str(item.product.price.currency)
-        return 'IRR'
-
-    def get_total_price(self, cart: Cart):
-        return sum([item.quantity * item.product.price.amount for item in cart.items.all()])
+        fields = ('id', 'items', 'item_count', 'price_currency', 'total_price',)
+        extra_kwargs = {'item_count': {'read_only': True}}
 
 
 class AddCartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField()
 
-    def validate_product_id(self, value):
-        if not Product.objects.filter(pk=value).exists():
-            raise serializers.ValidationError('No product with the given ID was found.')
-        return value
-
     def save(self, **kwargs):
         cart_id = self.context['cart_id']
         product_id = self.validated_data['product_id']
         quantity = self.validated_data['quantity']
 
+        store = get_cart_store()
         try:
-            cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product_id)
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            self.instance = CartItem.objects.create(cart_id=cart_id, **self.validated_data)
-
+            item_id, quantity = (store.add_item if store else add_cart_item)(cart_id, product_id, quantity)
+        except ProductNotFound:
+            raise serializers.ValidationError({'product_id': ['No product with the given ID was found.']})
+        except CartNotFound:
+            raise NotFound('No cart with the given ID was found.')
+        except QuantityTooLarge:
+            raise serializers.ValidationError({
+                'quantity': [f'A cart holds at most {MAX_QUANTITY} units of a product.'],
+            })
+
+        self.instance = CartItem(id=item_id, cart_id=cart_id, product_id=product_id, quantity=quantity)
+        self.instance._state.adding = False
         return self.instance
 
     class Meta:
@@ -147,6 +168,31 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         fields = ('id', 'product_id', 'quantity',)
 
 
+# noinspection PyAbstractClass
+class BulkCartItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY, required=False)
+
+
+# noinspection PyAbstractClass
+class BulkCartItemsSerializer(serializers.Serializer):
+    operation = serializers.ChoiceField(choices=BULK_OPERATIONS)
+    items = BulkCartItemSerializer(many=True, allow_empty=False, max_length=100)
+
+    def validate(self, attrs):
+        items = attrs['items']
+        if attrs['operation'] != REMOVE and any('quantity' not in item for item in items):
+            raise serializers.ValidationError({'items': ['Every item must have a quantity.']})
+
+        product_ids = {item['product_id'] for item in items}
+        missing = product_ids - set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+        if missing:
+            raise serializers.ValidationError({
+                'items': [f'No product with the given ID was found: {product_id}' for product_id in sorted(missing)]
+            })
+        return attrs
+
+
 class UpdateCartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
@@ -154,34 +200,36 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = SimpleProductSerializer()
-    total_price = serializers.SerializerMethodField()
+    product = serializers.SerializerMethodField()
+    # Annotated by the database, see `OrderViewSet.get_queryset`
+    total_price = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
 
     class Meta:
         model = OrderItem
         fields = ('id', 'product', 'unit_price', 'unit_price_currency', 'quantity', 'total_price',)
 
-    def get_total_price(self, order_item: OrderItem):
-        return order_item.quantity * order_item.product.price.amount
+    def get_product(self, order_item: OrderItem):
+        # From the snapshot taken at checkout, not the current product
+        return {'id': order_item.product_id, 'title': order_item.product_title, 'price': order_item.unit_price.amount}
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True, read_only=True)
-    price_currency = serializers.SerializerMethodField()
-    total_price = serializers.SerializerMethodField()
+class OrderSummarySerializer(serializers.ModelSerializer):
+    price_currency = serializers.CharField(source='total_price_currency', read_only=True)
+    total_price = serializers.DecimalField(source='total_price.amount', max_digits=14, decimal_places=2, read_only=True)
 
     class Meta:
         model = Order
         read_only_fields = ('id',)
-        fields = ('id', 'user', 'placed_at', 'status', 'items', 'price_currency', 'total_price',)
+        fields = ('id', 'user', 'placed_at', 'status', 'item_count', 'price_currency', 'total_price',)
 
-    def get_price_currency(self, order: Order):
-        for item in order.items.all():
-            return str(item.product.price.currency)
-        return 'IRR'
 
-    def get_total_price(self, order: Order):
-        return sum([item.quantity * item.product.price.amount for item in order.items.all()])
+class OrderSerializer(OrderSummarySerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        read_only_fields = ('id',)
+        fields = ('id', 'user', 'placed_at', 'status', 'items', 'item_count', 'price_currency', 'total_price',)
 
 
 class UpdateOrderSerializer(serializers.ModelSerializer):
@@ -194,31 +242,16 @@ class UpdateOrderSerializer(serializers.ModelSerializer):
 class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
-    def validate_cart_id(self, cart_id):
-        if not Cart.objects.filter(pk=cart_id).exists():
-            raise serializers.ValidationError('No cart with the given ID was found.')
-        if CartItem.objects.filter(cart_id=cart_id).count() == 0:
-            raise serializers.ValidationError('The cart is empty.')
-        return cart_id
-
     def save(self, **kwargs):
-        with transaction.atomic():
-            cart_id = self.validated_data['cart_id']
-
-            user = User.objects.get(pk=self.context['user_id'])
-            order = Order.objects.create(user=user)
-
-            cart_items = CartItem.objects.select_related('product').filter(cart_id=cart_id)
-            order_items = [
-                OrderItem(
-                    order=order,
-                    product=item.product,
-                    unit_price=item.product.price,
-                    quantity=item.quantity
-                ) for item in cart_items
-            ]
-            OrderItem.objects.bulk_create(order_items)
-
-            Cart.objects.filter(pk=cart_id).delete()
-
-            return order
+        cart_id, user_id = self.validated_data['cart_id'], self.context['user_id']
+        store = get_cart_store()
+        try:
+            if store is not None:
+                return store.check_out(cart_id, lambda stored_cart_id: place_order(stored_cart_id, user_id))
+            return place_order(cart_id, user_id)
+        except CartNotFound:
+            raise serializers.ValidationError({'cart_id': ['No cart with the given ID was found.']})
+        except EmptyCart:
+            raise serializers.ValidationError({'cart_id': ['The cart is empty.']})
+        except OutOfStock as e:
+            raise serializers.ValidationError({'cart_id': [str(e)]})
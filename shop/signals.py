@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from . import caching, images, suggest
+from .carts import recalculate_cart_totals
+from .models import Product, Brand, Category, Cart
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Category)
+def catalog_changed(sender, **kwargs):
+    caching.invalidate(sender)
+    suggest.cache.clear()
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {'price', 'price_currency'} & set(update_fields):
+        return
+    # A new price changes the total of every cart holding the product, other changes cannot
+    if not created and instance.has_price_changed():
+        recalculate_cart_totals(Cart.objects.filter(items__product=instance))
+    instance._loaded_price = instance.get_price_key()
+
+
+@receiver(post_save, sender=Product)
+def product_image_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    # Existing variants are looked for by the worker, keeping storage calls out of the request
+    if instance.image and instance.has_image_changed():
+        name = instance.image.name
+        transaction.on_commit(lambda: images.schedule_variants(name))
+    instance._loaded_image = instance.image.name or ''
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    instance._affected_cart_ids = list(Cart.objects.filter(items__product=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    affected = getattr(instance, '_affected_cart_ids', None)
+    if affected:
+        recalculate_cart_totals(Cart.objects.filter(pk__in=affected))
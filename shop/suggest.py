@@ -0,0 +1,71 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import F, Lookup, Value, CharField
+
+from shoppy.lru import LRUCache
+from .models import Product, Brand, Category
+
+MIN_QUERY_LENGTH = 2
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 20
+
+# Hot prefixes are answered from memory; entries are dropped on catalog changes in this process
+# (see `shop.signals`) and expire after a minute so other processes catch up as well.
+cache = LRUCache(maxsize=2048, ttl=60)
+
+SOURCES = (
+    ('products', Product, 'title'),
+    ('brands', Brand, 'name'),
+    ('categories', Category, 'name'),
+)
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    """
+    Return up to ``limit`` product titles, brand names and category names containing ``query``,
+    most similar first. All three lookups run as a single ``UNION ALL`` served by trigram indexes.
+    """
+    query = ' '.join(query.split()).lower()
+    if len(query) < MIN_QUERY_LENGTH:
+        return {kind: [] for kind, _, _ in SOURCES}
+
+    key = (query, limit)
+    suggestions = cache.get(key)
+    if suggestions is None:
+        suggestions = fetch_suggestions(query, limit)
+        cache.set(key, suggestions)
+    return suggestions
+
+
+class ILike(Lookup):
+    """
+    A case-insensitive ``LIKE``. Unlike ``icontains``, which compares the ``UPPER()`` of both sides,
+    it is served by the ``gin_trgm_ops`` indexes of the plain columns.
+    """
+    lookup_name = 'ilike'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} ILIKE {rhs}', [*lhs_params, *rhs_params]
+
+
+def get_suggestions_queryset(query, limit):
+    pattern = f'%{connection.ops.prep_for_like_query(query)}%'
+    querysets = [
+        model.objects.filter(ILike(F(field), pattern)).annotate(
+            kind=Value(kind, output_field=CharField()),
+            value=F(field),
+            similarity=TrigramSimilarity(field, query),
+        ).order_by('-similarity', field).values_list('kind', 'value', 'similarity')[:limit]
+        for kind, model, field in SOURCES
+    ]
+    return querysets[0].union(*querysets[1:], all=True)
+
+
+def fetch_suggestions(query, limit):
+    rows = sorted(get_suggestions_queryset(query, limit), key=lambda row: (-row[2], row[1]))
+    suggestions = {kind: [] for kind, _, _ in SOURCES}
+    for kind, value, _ in rows:
+        suggestions[kind].append(value)
+    return suggestions
@@ -0,0 +1,167 @@
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.models import Product, Brand, Category, Cart, CartItem, Order
+from shoppy.query_budget import QueryCounter
+
+User = get_user_model()
+
+
+def sample_product(**params):
+    defaults = {
+        'title': 'Sample product',
+        'price': Money(1, 'USD'),
+        'brand': Brand.objects.create(name='Sample brand'),
+        'category': Category.objects.create(name='Sample category'),
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+class ResponseCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(self.user)
+
+    def test_cached_responses_are_served_without_queries(self):
+        sample_product()
+        url = reverse('shop:products-list')
+        first = self.client.get(url)
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            second = self.client.get(url)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(counter.count, 0)
+
+    def test_query_params_are_part_of_the_key(self):
+        sample_product(color='red')
+        sample_product(color='blue')
+
+        everything = self.client.get(reverse('shop:products-list'))
+        red = self.client.get(reverse('shop:products-list') + '?color=red')
+
+        self.assertEqual(everything.json()['count'], 2)
+        self.assertEqual(red.json()['count'], 1)
+
+    def test_host_and_scheme_are_part_of_the_key(self):
+        brand = Brand.objects.create(name='Sample brand')
+        category = Category.objects.create(name='Sample category')
+        for i in range(11):
+            Product.objects.create(title=f'Product{i}', price=Money(1, 'USD'), brand=brand, category=category)
+        url = reverse('shop:products-list')
+
+        self.client.get(url, HTTP_HOST='evil.example')
+        response = self.client.get(url, HTTP_HOST='shop.example')
+        secure = self.client.get(url, HTTP_HOST='shop.example', secure=True)
+
+        self.assertTrue(response.json()['next'].startswith('http://shop.example/'))
+        self.assertTrue(secure.json()['next'].startswith('https://shop.example/'))
+
+    def test_saving_a_product_invalidates_cached_responses(self):
+        product = sample_product(title='Old title')
+        url = reverse('shop:products-detail', args=[product.id])
+        self.client.get(url)
+
+        product.title = 'New title'
+        product.save()
+
+        self.assertEqual(self.client.get(url).json()['title'], 'New title')
+
+    def test_renaming_a_brand_invalidates_cached_products(self):
+        product = sample_product()
+        url = reverse('shop:products-detail', args=[product.id])
+        self.client.get(url)
+
+        product.brand.name = 'Renamed brand'
+        product.brand.save()
+
+        self.assertEqual(self.client.get(url).json()['brand']['name'], 'Renamed brand')
+
+    def test_if_etag_matches_returns_304(self):
+        Brand.objects.create(name='Brand1')
+        url = reverse('shop:brands-list')
+        etag = self.client.get(url)['ETag']
+
+        first = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        Brand.objects.create(name='Brand2')
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(first.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(second['ETag'], etag)
+
+    def test_file_based_cache_backend_can_be_used(self):
+        sample_product()
+        url = reverse('shop:products-list')
+
+        with TemporaryDirectory() as location:
+            cache_settings = {
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'responses': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+            }
+            with self.settings(CACHES=cache_settings, SHOP_RESPONSE_CACHE={'ALIAS': 'responses'}):
+                first = self.client.get(url)
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    second = self.client.get(url)
+
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(counter.count, 0)
+
+
+class ConditionalGetTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(self.user)
+
+    def test_unchanged_cart_returns_304_without_serializing(self):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=sample_product(), quantity=1)
+        url = reverse('shop:carts-detail', args=[cart.id])
+        etag = self.client.get(url)['ETag']
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(counter.count, 1)
+
+    def test_adding_an_item_or_repricing_a_product_changes_the_cart_etag(self):
+        cart = Cart.objects.create()
+        product = sample_product()
+        url = reverse('shop:carts-detail', args=[cart.id])
+        etags = [self.client.get(url)['ETag']]
+
+        self.client.post(reverse('shop:cartitems-list', args=[cart.id]), {'product_id': product.id, 'quantity': 1})
+        etags.append(self.client.get(url)['ETag'])
+        product.price = Money(2, 'USD')
+        product.save()
+        etags.append(self.client.get(url)['ETag'])
+
+        self.assertEqual(len(set(etags)), 3)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[0]).status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since_returns_304(self):
+        Order.objects.create(user=self.user)
+        url = reverse('shop:orders-list')
+        last_modified = self.client.get(url)['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
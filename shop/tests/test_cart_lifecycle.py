@@ -0,0 +1,63 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from djmoney.money import Money
+
+from shop.cart_lifecycle import reap_idle_carts, get_cart_storage_stats
+from shop.carts import add_cart_item
+from shop.models import Product, Brand, Category, Cart, CartItem
+
+
+class ReapIdleCartsTestCase(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            title='Product1', price=Money(10, 'USD'),
+            brand=Brand.objects.create(name='Brand1'), category=Category.objects.create(name='Category1'),
+        )
+
+    def sample_cart(self, idle_days):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - timedelta(days=idle_days))
+        return cart
+
+    def test_idle_carts_are_deleted_in_batches(self):
+        idle = [self.sample_cart(idle_days=40) for _ in range(5)]
+        active = self.sample_cart(idle_days=1)
+
+        self.assertEqual(reap_idle_carts(batch_size=2), (5, 5))
+
+        self.assertEqual(list(Cart.objects.values_list('pk', flat=True)), [active.pk])
+        self.assertFalse(CartItem.objects.filter(cart__in=idle).exists())
+
+    def test_changing_a_cart_keeps_it(self):
+        cart = self.sample_cart(idle_days=40)
+
+        add_cart_item(cart.pk, self.product.pk, 1)
+
+        self.assertEqual(reap_idle_carts(), (0, 0))
+
+    def test_commands(self):
+        self.sample_cart(idle_days=40)
+        self.sample_cart(idle_days=3)
+        out = StringIO()
+
+        call_command('cart_storage_report', stdout=out)
+        call_command('reap_idle_carts', '--days', '2', '--pause', '0', stdout=out)
+
+        self.assertIn('1 carts are idle', out.getvalue())
+        self.assertIn('Deleted 2 idle carts and 2 cart items', out.getvalue())
+        self.assertFalse(Cart.objects.exists())
+
+    def test_storage_stats(self):
+        self.sample_cart(idle_days=40)
+
+        stats = get_cart_storage_stats()
+
+        self.assertEqual(set(stats['tables']), {Cart._meta.db_table, CartItem._meta.db_table})
+        self.assertGreater(stats['tables'][Cart._meta.db_table]['total_size'], 0)
+        self.assertEqual(stats['idle_carts'], 1)
@@ -0,0 +1,150 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.cart_store import CartBusy, get_cart_store
+from shop.checkout import place_order
+from shop.models import Product, Brand, Category, Cart, CartItem, Order
+from shop.views import CartViewSet
+from shoppy.query_budget import QueryBudgetTestMixin
+
+User = get_user_model()
+
+
+@override_settings(SHOP_CART_STORE={'BACKEND': 'shop.cart_store.CacheCartStore'})
+class CacheCartStoreTestCase(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='user1', password='pass123456'))
+        brand = Brand.objects.create(name='Brand1')
+        category = Category.objects.create(name='Category1')
+        self.product1 = Product.objects.create(title='Product1', price=Money(10, 'USD'), brand=brand, category=category)
+        self.product2 = Product.objects.create(title='Product2', price=Money(5, 'USD'), brand=brand, category=category)
+        self.cart_id = self.client.post(reverse('shop:carts-list')).data['id']
+
+    def add(self, product, quantity):
+        return self.client.post(
+            reverse('shop:cartitems-list', args=[self.cart_id]), {'product_id': product.id, 'quantity': quantity}
+        )
+
+    def test_cart_changes_do_not_write_to_the_database(self):
+        self.add(self.product1, 1)
+        response = self.add(self.product1, 2)
+        self.add(self.product2, 1)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'id': self.product1.id, 'product_id': self.product1.id, 'quantity': 3})
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_cart_renders_like_a_stored_cart(self):
+        self.add(self.product1, 3)
+        self.add(self.product2, 1)
+
+        with self.assertWithinQueryBudget(CartViewSet, 'retrieve') as counter:
+            response = self.client.get(reverse('shop:carts-detail', args=[self.cart_id]))
+
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(response.data['item_count'], 4)
+        self.assertEqual(response.data['price_currency'], 'USD')
+        self.assertEqual(response.data['total_price'], 35)
+        self.assertEqual(response.data['items'][0], {
+            'id': self.product1.id,
+            'product': {'id': self.product1.id, 'title': 'Product1', 'price': 10},
+            'quantity': 3,
+            'price_currency': 'USD',
+            'total_price': 30,
+        })
+
+    def test_items_can_be_changed_and_removed(self):
+        self.add(self.product1, 1)
+        self.add(self.product2, 1)
+        item_url = reverse('shop:cartitems-detail', args=[self.cart_id, self.product1.id])
+
+        patched = self.client.patch(item_url, {'quantity': 4})
+        deleted = self.client.delete(reverse('shop:cartitems-detail', args=[self.cart_id, self.product2.id]))
+        missing = self.client.delete(reverse('shop:cartitems-detail', args=[self.cart_id, self.product2.id]))
+        items = self.client.get(reverse('shop:cartitems-list', args=[self.cart_id]))
+
+        self.assertEqual(patched.data, {'quantity': 4})
+        self.assertEqual(deleted.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual([(item['id'], item['quantity']) for item in items.data], [(self.product1.id, 4)])
+
+    def test_bulk_changes(self):
+        self.add(self.product1, 1)
+
+        response = self.client.post(reverse('shop:cartitems-bulk', args=[self.cart_id]), {
+            'operation': 'add',
+            'items': [{'product_id': self.product1.id, 'quantity': 2}, {'product_id': self.product2.id, 'quantity': 1}],
+        }, format='json')
+
+        self.assertEqual([(item['id'], item['quantity']) for item in response.data], [
+            (self.product1.id, 3), (self.product2.id, 1),
+        ])
+
+    def test_missing_carts_and_products_return_errors(self):
+        missing_cart = self.client.get(reverse('shop:carts-detail', args=['5a0a0a3e-0b4e-4a5e-9d0b-0a0a0a0a0a0a']))
+        missing_product = self.client.post(
+            reverse('shop:cartitems-list', args=[self.cart_id]), {'product_id': 0, 'quantity': 1}
+        )
+        deleted = self.client.delete(reverse('shop:carts-detail', args=[self.cart_id]))
+
+        self.assertEqual(missing_cart.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(missing_product.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(deleted.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            self.client.get(reverse('shop:carts-detail', args=[self.cart_id])).status_code, status.HTTP_404_NOT_FOUND
+        )
+
+    def test_checkout_materializes_the_cart_once(self):
+        self.add(self.product1, 2)
+
+        response = self.client.post(reverse('shop:orders-list'), {'cart_id': self.cart_id})
+        again = self.client.post(reverse('shop:orders-list'), {'cart_id': self.cart_id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_price'], 20)
+        self.assertEqual(again.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_quantities_past_the_largest_one_return_400(self):
+        self.add(self.product1, 30000)
+
+        added = self.add(self.product1, 30000)
+        bulk = self.client.post(reverse('shop:cartitems-bulk', args=[self.cart_id]), {
+            'operation': 'add',
+            'items': [
+                {'product_id': self.product2.id, 'quantity': 1}, {'product_id': self.product1.id, 'quantity': 3000},
+            ],
+        }, format='json')
+        items = self.client.get(reverse('shop:cartitems-list', args=[self.cart_id]))
+
+        self.assertEqual(added.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(bulk.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([(item['id'], item['quantity']) for item in items.data], [(self.product1.id, 30000)])
+
+    def test_checkout_losing_the_lock_keeps_the_cart(self):
+        self.add(self.product1, 2)
+        store = get_cart_store()
+        user_id = User.objects.get().id
+
+        def place_order_past_the_lock_timeout(cart_id):
+            order = place_order(cart_id, user_id)
+            # The lock expired and another request took it to change the cart
+            cache.set(store.get_lock_key(cart_id), 'another-request')
+            return order
+
+        with self.assertRaises(CartBusy):
+            store.check_out(self.cart_id, place_order_past_the_lock_timeout)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(cache.get(store.get_lock_key(self.cart_id)), 'another-request')
+        self.assertEqual(store.get(self.cart_id).item_count, 2)
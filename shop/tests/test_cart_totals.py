@@ -0,0 +1,276 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.carts import add_cart_item
+from shop.models import Product, Brand, Category, Cart, CartItem
+from shop.views import CartItemViewSet
+from shoppy.query_budget import QueryBudgetTestMixin
+
+User = get_user_model()
+
+
+def sample_product(**params):
+    defaults = {
+        'title': 'Sample product',
+        'price': Money(10, 'USD'),
+        'brand': Brand.objects.create(name='Sample brand'),
+        'category': Category.objects.create(name='Sample category'),
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+class CartTotalsTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create()
+        self.items_url = reverse('shop:cartitems-list', args=[self.cart.id])
+
+    def add(self, product, quantity):
+        return self.client.post(self.items_url, {'product_id': product.id, 'quantity': quantity})
+
+    def test_adding_items_updates_the_stored_totals(self):
+        product1 = sample_product()
+        product2 = sample_product(price=Money('2.50', 'USD'))
+
+        self.add(product1, 2)
+        self.add(product2, 1)
+        self.add(product1, 1)
+
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 4)
+        self.assertEqual(self.cart.total_price, Money('32.50', 'USD'))
+
+    def test_updating_and_removing_items_updates_the_stored_totals(self):
+        product1 = sample_product()
+        product2 = sample_product(price=Money(3, 'USD'))
+        item1 = self.add(product1, 2).data['id']
+        item2 = self.add(product2, 1).data['id']
+
+        self.client.patch(reverse('shop:cartitems-detail', args=[self.cart.id, item1]), {'quantity': 5})
+        self.client.delete(reverse('shop:cartitems-detail', args=[self.cart.id, item2]))
+
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 5)
+        self.assertEqual(self.cart.total_price, Money(50, 'USD'))
+
+    def test_changing_or_deleting_a_product_recalculates_carts_holding_it(self):
+        product1 = sample_product()
+        product2 = sample_product()
+        self.add(product1, 2)
+        self.add(product2, 1)
+
+        product1.price = Money(20, 'USD')
+        product1.save()
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.total_price, Money(50, 'USD'))
+
+        product2.delete()
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 2)
+        self.assertEqual(self.cart.total_price, Money(40, 'USD'))
+
+    def test_only_price_changes_recalculate_carts(self):
+        product = sample_product()
+        self.add(product, 2)
+        # A drifted total shows whether the carts were recalculated
+        Cart.objects.update(total_price=Money(1, 'USD'))
+
+        product = Product.objects.get(pk=product.pk)
+        product.title = 'Renamed'
+        product.save()
+        product.price = Money(10, 'USD')
+        product.save(update_fields=['price'])
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.total_price, Money(1, 'USD'))
+
+        product.price = Money(15, 'USD')
+        product.save()
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.total_price, Money(30, 'USD'))
+
+    def test_retrieve_cart_serves_the_stored_totals(self):
+        self.add(sample_product(), 3)
+
+        response = self.client.get(reverse('shop:carts-detail', args=[self.cart.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['item_count'], 3)
+        self.assertEqual(response.data['price_currency'], 'USD')
+        self.assertEqual(Decimal(response.data['total_price']), Decimal(30))
+        self.assertEqual(Decimal(response.data['items'][0]['total_price']), Decimal(30))
+
+
+class AddCartItemTestCase(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create()
+        self.items_url = reverse('shop:cartitems-list', args=[self.cart.id])
+
+    def test_adding_an_item_is_a_single_query(self):
+        product = sample_product()
+
+        with self.assertWithinQueryBudget(CartItemViewSet, 'create') as counter:
+            first = self.client.post(self.items_url, {'product_id': product.id, 'quantity': 2})
+        second = self.client.post(self.items_url, {'product_id': product.id, 'quantity': 3})
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second.data['quantity'], 5)
+        self.assertEqual(CartItem.objects.get(cart=self.cart).quantity, 5)
+
+    def test_adding_a_missing_product_returns_400(self):
+        response = self.client.post(self.items_url, {'product_id': 999999, 'quantity': 1})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('product_id', response.data)
+
+    def test_adding_to_a_missing_cart_returns_404(self):
+        url = reverse('shop:cartitems-list', args=[uuid4()])
+
+        response = self.client.post(url, {'product_id': sample_product().id, 'quantity': 1})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_adding_past_the_largest_quantity_returns_400(self):
+        product = sample_product()
+        self.client.post(self.items_url, {'product_id': product.id, 'quantity': 30000})
+
+        response = self.client.post(self.items_url, {'product_id': product.id, 'quantity': 30000})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('quantity', response.data)
+        self.assertEqual(CartItem.objects.get(cart=self.cart).quantity, 30000)
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 30000)
+
+
+class BulkCartItemsTestCase(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create()
+        self.url = reverse('shop:cartitems-bulk', args=[self.cart.id])
+        self.products = [sample_product(price=Money(i + 1, 'USD')) for i in range(3)]
+
+    def bulk(self, operation, *items):
+        payload = {
+            'operation': operation,
+            'items': [{'product_id': product.id, 'quantity': quantity} for product, quantity in items],
+        }
+        return self.client.post(self.url, payload, format='json')
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity'))
+
+    def test_add_merges_duplicates_and_existing_items(self):
+        product1, product2, _ = self.products
+        CartItem.objects.create(cart=self.cart, product=product1, quantity=1)
+
+        with self.assertWithinQueryBudget(CartItemViewSet, 'bulk'):
+            response = self.bulk('add', (product1, 2), (product2, 1), (product2, 3))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(self.quantities(), {product1.id: 3, product2.id: 4})
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 7)
+        self.assertEqual(self.cart.total_price, Money(11, 'USD'))
+
+    def test_set_and_remove(self):
+        product1, product2, product3 = self.products
+        self.bulk('add', (product1, 5), (product2, 5), (product3, 5))
+
+        self.bulk('set', (product1, 1), (product2, 2))
+        self.bulk('remove', (product3, 1))
+
+        self.assertEqual(self.quantities(), {product1.id: 1, product2.id: 2})
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.total_price, Money(5, 'USD'))
+
+    def test_missing_products_reject_the_whole_batch(self):
+        response = self.client.post(self.url, {
+            'operation': 'add',
+            'items': [{'product_id': self.products[0].id, 'quantity': 1}, {'product_id': 999999, 'quantity': 1}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('999999', str(response.data['items']))
+        self.assertEqual(self.quantities(), {})
+
+    def test_quantities_past_the_largest_one_reject_the_whole_batch(self):
+        product1, product2, _ = self.products
+        self.bulk('add', (product2, 30000))
+
+        merged = self.bulk('add', (product1, 30000), (product1, 30000))
+        added = self.bulk('add', (product1, 1), (product2, 30000))
+
+        self.assertEqual(merged.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(added.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.quantities(), {product2.id: 30000})
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 30000)
+
+
+class ConcurrentAddCartItemTestCase(TransactionTestCase):
+
+    def test_concurrent_additions_are_not_lost(self):
+        cart = Cart.objects.create()
+        product = sample_product()
+
+        def add(_):
+            try:
+                return add_cart_item(cart.id, product.id, 1)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(add, range(8)))
+
+        cart.refresh_from_db()
+        self.assertEqual(CartItem.objects.get(cart=cart).quantity, 8)
+        self.assertEqual(cart.item_count, 8)
+        self.assertEqual(cart.total_price, Money(80, 'USD'))
+
+
+class ReconcileCartTotalsTestCase(TestCase):
+
+    def setUp(self):
+        self.cart = Cart.objects.create()
+        CartItem.objects.create(cart=self.cart, product=sample_product(), quantity=2)
+
+    def test_drifted_carts_are_reported_and_fixed(self):
+        out = StringIO()
+        call_command('reconcile_cart_totals', stdout=out)
+        self.assertIn(f'{self.cart.id}  items: 0 (expected 2)', out.getvalue())
+        self.assertIn('1 carts have drifted totals', out.getvalue())
+
+        call_command('reconcile_cart_totals', '--fix', stdout=StringIO())
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 2)
+        self.assertEqual(self.cart.total_price, Money(20, 'USD'))
+
+        out = StringIO()
+        call_command('reconcile_cart_totals', stdout=out)
+        self.assertIn('0 carts have drifted totals', out.getvalue())
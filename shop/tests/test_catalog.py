@@ -0,0 +1,234 @@
+import csv
+import gzip
+import json
+from datetime import timedelta
+from io import StringIO
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.catalog import read_rows, import_products, export_products
+from shop.models import Product, Brand, Category, Cart, CartItem
+from shop.views import ProductViewSet
+from shoppy.query_budget import QueryCounter, QueryBudgetTestMixin
+
+User = get_user_model()
+
+CSV = '''title,price,price_currency,color,brand,category
+Shirt,10.00,USD,red,Brand1,Category1
+Hat,,USD,,Brand2,Category1
+Shoes,20.50,USD,blue,Brand2,Category2
+'''
+
+
+def sample_product(**params):
+    defaults = {
+        'title': 'Sample product',
+        'price': Money(10, 'USD'),
+        'brand': Brand.objects.create(name='Sample brand'),
+        'category': Category.objects.create(name='Sample category'),
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+class ImportProductsTestCase(TestCase):
+
+    def test_rows_are_imported_and_invalid_ones_reported(self):
+        brand = Brand.objects.create(name='Brand1')
+
+        result = import_products(read_rows(StringIO(CSV), 'csv'))
+
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([error['line'] for error in result['errors']], [3])
+        self.assertIn('price', result['errors'][0]['errors'])
+        shirt = Product.objects.get(title='Shirt')
+        self.assertEqual(shirt.brand, brand)
+        self.assertEqual(shirt.price, Money(10, 'USD'))
+        self.assertEqual(Brand.objects.count(), 2)
+        self.assertEqual(sorted(Category.objects.values_list('name', flat=True)), ['Category1', 'Category2'])
+
+    def test_rows_with_an_id_update_the_product(self):
+        product = sample_product()
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+        rows = [
+            json.dumps({'id': product.id, 'title': 'Renamed', 'price': '12.00', 'price_currency': 'USD',
+                        'brand': 'Sample brand', 'category': 'Other'}),
+            json.dumps({'id': 999999, 'title': 'Missing', 'price': '1', 'brand': 'B', 'category': 'C'}),
+            'not json',
+        ]
+
+        result = import_products(read_rows(StringIO('\n'.join(rows)), 'jsonl'))
+
+        self.assertEqual((result['created'], result['updated']), (0, 1))
+        self.assertEqual([error['line'] for error in result['errors']], [2, 3])
+        product.refresh_from_db()
+        self.assertEqual((product.title, product.price, product.category.name), ('Renamed', Money(12, 'USD'), 'Other'))
+        cart.refresh_from_db()
+        self.assertEqual(cart.total_price, Money(24, 'USD'))
+        self.assertFalse(Brand.objects.filter(name='B').exists())
+
+    def test_update_rows_only_change_the_given_columns(self):
+        product = sample_product(description='Kept', color='red', size='large')
+        rows = StringIO(
+            'id,title,price,price_currency,brand,category\n'
+            f'{product.id},Renamed,12.00,USD,Sample brand,Sample category\n'
+        )
+
+        result = import_products(read_rows(rows, 'csv'))
+
+        self.assertEqual(result['updated'], 1)
+        product.refresh_from_db()
+        self.assertEqual(
+            (product.title, product.price, product.description, product.color, product.size),
+            ('Renamed', Money(12, 'USD'), 'Kept', 'red', 'large'),
+        )
+
+    def test_updates_keeping_the_price_do_not_recalculate_carts(self):
+        product = sample_product()
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+        Cart.objects.update(total_price=Money(1, 'USD'))
+        row = {'id': product.id, 'title': 'Renamed', 'price': str(product.price.amount),
+               'price_currency': str(product.price.currency), 'brand': 'Sample brand', 'category': 'Other'}
+
+        import_products(read_rows(StringIO(json.dumps(row)), 'jsonl'))
+
+        cart.refresh_from_db()
+        self.assertEqual(cart.total_price, Money(1, 'USD'))
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        def import_rows(count):
+            lines = [f'{{"title": "Product{i}", "price": "1", "brand": "Brand{i}", "category": "C{count}"}}'
+                     for i in range(count)]
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                import_products(read_rows(StringIO('\n'.join(lines)), 'jsonl'))
+            return counter.count
+
+        self.assertEqual(import_rows(2), import_rows(50))
+
+
+class CatalogEndpointsTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser('superadmin', password='pass1234')
+        self.client.force_authenticate(self.admin_user)
+
+    def test_admin_imports_a_file(self):
+        file = SimpleUploadedFile('products.csv', CSV.encode(), content_type='text/csv')
+
+        response = self.client.post(reverse('shop:products-import-products'), {'file': file})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(len(response.data['errors']), 1)
+
+    def test_unknown_formats_are_rejected(self):
+        file = SimpleUploadedFile('products.xml', b'<products/>')
+
+        response = self.client.post(reverse('shop:products-import-products'), {'file': file})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_only_admins_can_import(self):
+        user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(user)
+        file = SimpleUploadedFile('products.csv', CSV.encode())
+
+        response = self.client.post(reverse('shop:products-import-products'), {'file': file})
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ExportProductsTestCase(TestCase):
+
+    def test_export_can_be_imported_back(self):
+        sample_product(title='Shirt, red', description='Line 1\nLine 2')
+        out = StringIO()
+
+        call_command('export_products', '--format', 'csv', stdout=out)
+        product_id = Product.objects.get().id
+        Product.objects.update(title='Changed')
+        result = import_products(read_rows(StringIO(out.getvalue()), 'csv'))
+
+        self.assertEqual((result['created'], result['updated'], result['errors']), (0, 1, []))
+        product = Product.objects.get(pk=product_id)
+        self.assertEqual((product.title, product.description), ('Shirt, red', 'Line 1\nLine 2'))
+
+    def test_jsonl_export(self):
+        product = sample_product()
+
+        lines = list(export_products('jsonl'))
+
+        self.assertEqual([json.loads(line) for line in lines], [{
+            'id': product.id, 'title': 'Sample product', 'description': None, 'price': '10.00',
+            'price_currency': 'USD', 'size': 'none', 'color': 'none', 'brand': 'Sample brand',
+            'category': 'Sample category',
+        }])
+
+
+class ExportEndpointTestCase(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(self.user)
+
+    def export(self, query='', **headers):
+        response = self.client.get(reverse('shop:products-export') + query, **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, b''.join(response.streaming_content)
+
+    def test_catalog_is_streamed_in_one_query(self):
+        products = [sample_product(title=f'Product{i}') for i in range(3)]
+
+        with self.assertWithinQueryBudget(ProductViewSet, 'export'):
+            response, content = self.export()
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [p.id for p in products])
+
+    def test_since_exports_only_modified_products(self):
+        old = sample_product(title='Old')
+        renamed = sample_product(title='Renamed brand')
+        changed = sample_product(title='Changed')
+        Product.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        Brand.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        Category.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        Brand.objects.filter(pk=renamed.brand_id).update(name='New name', updated_at=timezone.now())
+        Product.objects.filter(pk=changed.pk).update(updated_at=timezone.now())
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+
+        _, content = self.export('?' + urlencode({'since': since, 'output': 'csv'}))
+
+        rows = list(csv.DictReader(StringIO(content.decode())))
+        self.assertEqual([row['id'] for row in rows], [str(renamed.id), str(changed.id)])
+        self.assertEqual(rows[0]['brand'], 'New name')
+        self.assertNotIn(str(old.id), [row['id'] for row in rows])
+
+    def test_export_is_gzipped_for_clients_accepting_it(self):
+        sample_product()
+
+        response, content = self.export(HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(content))['title'], 'Sample product')
+
+    def test_anonymous_users_cannot_export(self):
+        self.client.force_authenticate(None)
+
+        response = self.client.get(reverse('shop:products-export'))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.models import Product, Brand, Category, Cart, CartItem, Order
+from shop.views import OrderViewSet
+from shoppy.query_budget import QueryBudgetTestMixin
+
+User = get_user_model()
+
+
+def sample_product(**params):
+    defaults = {
+        'title': 'Sample product',
+        'price': Money(10, 'USD'),
+        'brand': Brand.objects.create(name='Sample brand'),
+        'category': Category.objects.create(name='Sample category'),
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+class CheckoutTestCase(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, cart_id):
+        return self.client.post(reverse('shop:orders-list'), {'cart_id': str(cart_id)})
+
+    def test_checkout_turns_the_cart_into_an_order(self):
+        cart = Cart.objects.create()
+        for i in range(5):
+            CartItem.objects.create(cart=cart, product=sample_product(title=f'Product{i}'), quantity=i + 1)
+
+        with self.assertWithinQueryBudget(OrderViewSet, 'create'):
+            response = self.checkout(cart.id)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        order = Order.objects.get()
+        self.assertEqual(response.data['id'], order.id)
+        self.assertEqual(response.data['user'], self.user.id)
+        self.assertEqual([item['product']['title'] for item in response.data['items']], [
+            f'Product{i}' for i in range(5)
+        ])
+        self.assertEqual(Decimal(response.data['total_price']), Decimal(150))
+        self.assertEqual(order.items.count(), 5)
+        self.assertFalse(Cart.objects.filter(pk=cart.id).exists())
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_checkout_of_a_missing_cart_returns_400(self):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=sample_product(), quantity=1)
+        self.checkout(cart.id)
+
+        response = self.checkout(cart.id)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['cart_id'], ['No cart with the given ID was found.'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_checkout_of_an_empty_cart_keeps_the_cart(self):
+        cart = Cart.objects.create()
+
+        response = self.checkout(cart.id)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['cart_id'], ['The cart is empty.'])
+        self.assertTrue(Cart.objects.filter(pk=cart.id).exists())
@@ -0,0 +1,36 @@
+from io import StringIO
+from tempfile import NamedTemporaryFile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class CatalogIndexReportTestCase(TestCase):
+
+    def report(self, *lines):
+        with NamedTemporaryFile('w', suffix='.log') as log:
+            log.write('\n'.join(lines))
+            log.flush()
+            out = StringIO()
+            call_command('catalog_index_report', log.name, stdout=out)
+        return out.getvalue()
+
+    def test_filter_combinations_are_reported_with_their_index(self):
+        output = self.report(
+            '127.0.0.1 - - [01/Jan/2022] "GET /api/shop/products/?category_id=1&ordering=price HTTP/1.1" 200 512',
+            '127.0.0.1 - - [01/Jan/2022] "GET /api/shop/products/?color=red&brand_id=2&price__gte=10 HTTP/1.1" 200 1',
+            '127.0.0.1 - - [01/Jan/2022] "GET /api/shop/products/?color=red HTTP/1.1" 200 512',
+            '127.0.0.1 - - [01/Jan/2022] "GET /api/shop/products/1/ HTTP/1.1" 200 512',
+        )
+
+        self.assertIn('covered    category_id + order by price  [shop_product_category_price]', output)
+        self.assertIn(
+            'covered    color + brand_id + price range + order by id  [shop_product_brand_color_price]', output
+        )
+        self.assertIn('partial    color + order by id  [shop_product_color_price]', output)
+        self.assertIn('1 of 3 catalog requests are not fully covered by an index', output)
+
+    def test_partial_indexes_are_ignored_when_their_condition_does_not_hold(self):
+        output = self.report('"GET /api/shop/products/?color=none&ordering=price HTTP/1.1"')
+
+        self.assertIn('uncovered  color + order by price  [-]', output)
@@ -0,0 +1,101 @@
+import csv
+import os
+from io import StringIO
+from tempfile import TemporaryDirectory
+from xml.etree import ElementTree
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from djmoney.money import Money
+
+from shop.feeds import generate_feed, get_feed_path
+from shop.inventory import set_stock
+from shop.models import Product, Brand, Category
+
+FEED_SETTINGS = {'SEGMENT_SIZE': 2, 'SITE_URL': 'https://shop.example'}
+
+
+class ProductFeedTestCase(TestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name, SHOP_FEED=FEED_SETTINGS)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.brand = Brand.objects.create(name='Brand & Co')
+        self.category = Category.objects.create(name='Category1')
+        self.products = [
+            Product.objects.create(
+                title=f'Product{i}', price=Money(10 + i, 'USD'), brand=self.brand, category=self.category,
+            )
+            for i in range(5)
+        ]
+
+    def read_csv(self):
+        with open(get_feed_path('csv'), encoding='utf-8', newline='') as file:
+            return list(csv.DictReader(file))
+
+    def test_xml_feed(self):
+        self.products[0].image = 'products/1.jpg'
+        self.products[0].save()
+        set_stock(self.products[1], 0)
+
+        generate_feed('xml')
+
+        namespace = {'g': 'http://base.google.com/ns/1.0'}
+        items = ElementTree.parse(get_feed_path('xml')).findall('channel/item')
+        self.assertEqual(len(items), 5)
+        first = {child.tag.split('}')[1]: child.text for child in items[0]}
+        self.assertEqual(first['link'], f'https://shop.example/products/{self.products[0].id}/')
+        self.assertEqual(first['price'], '10.00 USD')
+        self.assertEqual(first['brand'], 'Brand & Co')
+        self.assertTrue(first['image_link'].startswith('https://shop.example/'))
+        self.assertEqual(items[1].find('g:availability', namespace).text, 'out_of_stock')
+
+    def test_only_changed_segments_are_rendered_again(self):
+        self.assertEqual(generate_feed('csv'), len({p.id // 2 for p in self.products}))
+        self.assertEqual(generate_feed('csv'), 0)
+
+        self.products[4].title = 'Renamed'
+        self.products[4].save()
+        Product.objects.filter(pk=self.products[0].pk).delete()
+
+        remaining = {p.id // 2 for p in self.products[1:]}
+        self.assertEqual(generate_feed('csv'), len({self.products[0].id // 2, self.products[4].id // 2} & remaining))
+        rows = self.read_csv()
+        self.assertEqual([row['id'] for row in rows], [str(p.id) for p in self.products[1:]])
+        self.assertEqual(rows[-1]['title'], 'Renamed')
+
+    def test_renaming_a_brand_renders_its_products_again(self):
+        generate_feed('csv')
+
+        self.brand.name = 'New name'
+        self.brand.save()
+        generate_feed('csv')
+
+        self.assertEqual({row['brand'] for row in self.read_csv()}, {'New name'})
+
+    def test_swapping_availability_within_a_segment_renders_it_again(self):
+        first, second = next(
+            (product, following) for product, following in zip(self.products, self.products[1:])
+            if product.id // 2 == following.id // 2
+        )
+        set_stock(first, 0)
+        set_stock(second, 1)
+        generate_feed('csv')
+
+        set_stock(first, 1)
+        set_stock(second, 0)
+
+        self.assertEqual(generate_feed('csv'), 1)
+        availability = {row['id']: row['availability'] for row in self.read_csv()}
+        self.assertEqual(availability[str(first.id)], 'in_stock')
+        self.assertEqual(availability[str(second.id)], 'out_of_stock')
+
+    def test_command_writes_every_format(self):
+        call_command('generate_product_feed', '--full', stdout=StringIO())
+
+        self.assertTrue(os.path.exists(get_feed_path('xml')))
+        self.assertEqual(len(self.read_csv()), 5)
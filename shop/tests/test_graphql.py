@@ -0,0 +1,249 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from djmoney.money import Money
+from graphene.test import Client as GraphQLClient
+from graphql import parse
+from graphql_relay.connection.arrayconnection import offset_to_cursor
+
+from shop.loaders import RelatedPageLoader
+from shop.models import Product, Brand, Category
+from shoppy.graphql_cache import CachedDocumentBackend, get_query_hash
+from shoppy.query_budget import QueryCounter
+from shoppy.query_cost import QueryCost
+from shoppy.schema import schema
+
+
+class GraphQLBatchingTestCase(TestCase):
+
+    def setUp(self):
+        self.brands = [Brand.objects.create(name=f'Brand{i}') for i in range(3)]
+        self.categories = [Category.objects.create(name=f'Category{i}') for i in range(2)]
+        for i in range(12):
+            Product.objects.create(
+                title=f'Product{i}', price=Money(i + 1, 'USD'),
+                brand=self.brands[i % 3], category=self.categories[i % 2],
+            )
+
+    def execute(self, query):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            result = GraphQLClient(schema).execute(query, context_value=RequestFactory().get('/api/graphql'))
+        self.assertNotIn('errors', result)
+        return result['data'], counter.count
+
+    def test_foreign_keys_are_loaded_in_one_query_each(self):
+        data, queries = self.execute('''{
+            products(first: 100) { edges { node { title brand { name } category { name } } } }
+        }''')
+
+        nodes = [edge['node'] for edge in data['products']['edges']]
+        self.assertEqual(len(nodes), 12)
+        self.assertEqual(nodes[0], {
+            'title': 'Product11', 'brand': {'name': 'Brand2'}, 'category': {'name': 'Category1'},
+        })
+        # Count, page, brands and categories
+        self.assertEqual(queries, 4)
+
+    def test_reverse_connections_are_loaded_for_all_parents_at_once(self):
+        data, queries = self.execute('''{
+            brands(first: 10) { edges { node {
+                name
+                products(first: 2) { pageInfo { hasNextPage } edges { node { title brand { name } } } }
+            } } }
+        }''')
+
+        brands = [edge['node'] for edge in data['brands']['edges']]
+        self.assertEqual(brands[0]['name'], 'Brand0')
+        self.assertEqual([edge['node']['title'] for edge in brands[0]['products']['edges']], ['Product9', 'Product6'])
+        self.assertTrue(brands[0]['products']['pageInfo']['hasNextPage'])
+        self.assertEqual({edge['node']['brand']['name'] for edge in brands[2]['products']['edges']}, {'Brand2'})
+        # Count and page of brands, products of every brand, their brands
+        self.assertEqual(queries, 4)
+
+    def test_reverse_connections_keep_their_filters_and_pages(self):
+        data, _ = self.execute('''{
+            categories(name: "Category0") { edges { node {
+                last: products(title_Istartswith: "Product1", last: 1) { edges { node { title } } }
+                page: products(first: 2, after: "YXJyYXljb25uZWN0aW9uOjE=") {
+                    pageInfo { hasNextPage } edges { node { title } }
+                }
+            } } }
+        }''')
+
+        category = data['categories']['edges'][0]['node']
+        self.assertEqual([edge['node']['title'] for edge in category['last']['edges']], ['Product10'])
+        self.assertEqual([edge['node']['title'] for edge in category['page']['edges']], ['Product6', 'Product4'])
+        self.assertTrue(category['page']['pageInfo']['hasNextPage'])
+
+    def test_reverse_connections_load_the_last_pages_only(self):
+        data, _ = self.execute('''{
+            categories(name: "Category0") { edges { node {
+                last: products(last: 2) { pageInfo { hasPreviousPage } edges { cursor node { title } } }
+                before: products(last: 2, before: "%s") { edges { node { title } } }
+            } } }
+        }''' % offset_to_cursor(3))
+        loader = RelatedPageLoader(Product.objects.order_by('-id'), 'category', 0, None, last=2)
+        page = loader.batch_load_fn([self.categories[0].id]).get()[0]
+
+        category = data['categories']['edges'][0]['node']
+        self.assertEqual(
+            [(edge['cursor'], edge['node']['title']) for edge in category['last']['edges']],
+            [(offset_to_cursor(4), 'Product2'), (offset_to_cursor(5), 'Product0')],
+        )
+        self.assertTrue(category['last']['pageInfo']['hasPreviousPage'])
+        self.assertEqual([edge['node']['title'] for edge in category['before']['edges']], ['Product8', 'Product6'])
+        self.assertEqual(([product.title for product in page.objects], len(page)), (['Product2', 'Product0'], 6))
+
+
+class GraphQLQueryCostTestCase(TestCase):
+    PRODUCTS_QUERY = '''query Products($first: Int) {
+        products(first: $first) { edges { node { title ...BrandName } } }
+    }
+    fragment BrandName on ProductNode { brand { name } }'''
+
+    DEEP_QUERY = '''{
+        categories(first: 1) { edges { node { products(first: 1) { edges { node {
+            brand { products(first: 1) { edges { node { title } } } }
+        } } } } } }
+    }'''
+
+    def setUp(self):
+        brand = Brand.objects.create(name='Brand')
+        category = Category.objects.create(name='Category')
+        Product.objects.create(title='Product', price=Money(1, 'USD'), brand=brand, category=category)
+
+    def post(self, query, variables=None):
+        return self.client.post(
+            '/api/graphql', {'query': query, 'variables': variables or {}}, content_type='application/json',
+        )
+
+    def test_cost_is_weighted_by_page_sizes(self):
+        cost = QueryCost(schema, parse(self.PRODUCTS_QUERY), {'first': 5})
+        # products + edges + 5 * (node + title + brand + name)
+        self.assertEqual(cost.measure('Products'), (22, 5))
+        # Pages are as long as `RELAY_CONNECTION_MAX_LIMIT` without a page size
+        self.assertEqual(QueryCost(schema, parse(self.PRODUCTS_QUERY)).measure(), (402, 5))
+
+    def test_queries_within_budget_are_executed_and_logged(self):
+        with self.assertLogs('shoppy.query_cost', 'INFO') as logs:
+            response = self.post(self.PRODUCTS_QUERY, {'first': 5})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['products']['edges'][0]['node']['brand'], {'name': 'Brand'})
+        self.assertEqual(logs.records[0].graphql_operation, 'Products')
+        self.assertEqual(logs.records[0].graphql_cost, 22)
+
+    def test_expensive_queries_are_rejected_before_execution(self):
+        query = '{ brands(first: 100) { edges { node { products(first: 100) { edges { node { title } } } } } } }'
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter), self.assertLogs('shoppy.query_cost', 'WARNING'):
+            response = self.post(query)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['message'], 'Query cost 20302 exceeds the maximum of 10000')
+        self.assertEqual(counter.count, 0)
+
+    @override_settings(GRAPHQL_QUERY_COST={'MAX_COST': 100000})
+    def test_deep_queries_are_rejected(self):
+        response = self.post(self.DEEP_QUERY)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['message'], 'Query depth 11 exceeds the maximum of 10')
+
+    def test_introspection_is_not_charged(self):
+        cost = QueryCost(schema, parse('{ __schema { types { name fields { name type { name ofType { name } } } } } }'))
+        self.assertEqual(cost.measure(), (0, 0))
+
+
+class GraphQLCacheTestCase(TestCase):
+    BRANDS_QUERY = '{ brands(first: 10) { edges { node { name } } } }'
+
+    def setUp(self):
+        cache.clear()
+        self.brand = Brand.objects.create(name='Brand')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.manifest = os.path.join(directory.name, 'queries.json')
+        with open(self.manifest, 'w', encoding='utf-8') as file:
+            json.dump([self.BRANDS_QUERY], file)
+
+    def post(self, data):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.client.post('/api/graphql', data, content_type='application/json')
+        return response, counter.count
+
+    def get_brand_names(self, response):
+        return [edge['node']['name'] for edge in response.json()['data']['brands']['edges']]
+
+    def test_documents_are_parsed_and_validated_once(self):
+        backend = CachedDocumentBackend(maxsize=2)
+        document = backend.document_from_string(schema, self.BRANDS_QUERY)
+
+        self.assertIs(backend.document_from_string(schema, self.BRANDS_QUERY), document)
+        self.assertEqual(len(backend.documents), 1)
+        self.assertEqual(document.execute().data['brands']['edges'][0]['node']['name'], 'Brand')
+
+        invalid = backend.document_from_string(schema, '{ brands { unknown } }')
+        self.assertIs(backend.document_from_string(schema, '{ brands { unknown } }'), invalid)
+        self.assertTrue(invalid.execute().invalid)
+
+    def test_persisted_queries_are_sent_by_hash(self):
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': get_query_hash(self.BRANDS_QUERY)}}
+        with self.settings(GRAPHQL_CACHE={'PERSISTED_QUERIES': self.manifest}):
+            response, _ = self.post({'extensions': extensions})
+            self.assertEqual(self.get_brand_names(response), ['Brand'])
+
+            response = self.client.get(
+                '/api/graphql', {'extensions': json.dumps(extensions)}, HTTP_ACCEPT='application/json',
+            )
+            self.assertEqual(self.get_brand_names(response), ['Brand'])
+
+            response, _ = self.post({'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': '0' * 64}}})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['errors'][0]['message'], 'PersistedQueryNotFound')
+
+    def test_only_persisted_queries_are_accepted_when_required(self):
+        with self.settings(GRAPHQL_CACHE={'PERSISTED_QUERIES': self.manifest, 'PERSISTED_ONLY': True}):
+            response, _ = self.post({'query': self.BRANDS_QUERY})
+            self.assertEqual(response.status_code, 200)
+
+            response, _ = self.post({'query': '{ categories { edges { node { name } } } }'})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['errors'][0]['message'], 'Only persisted queries are allowed.')
+
+    def test_anonymous_catalog_results_are_cached_until_the_catalog_changes(self):
+        with self.settings(GRAPHQL_CACHE={'CACHE_RESULTS': True}):
+            response, queries = self.post({'query': self.BRANDS_QUERY})
+            self.assertEqual(self.get_brand_names(response), ['Brand'])
+            self.assertGreater(queries, 0)
+
+            response, queries = self.post({'query': self.BRANDS_QUERY})
+            self.assertEqual(self.get_brand_names(response), ['Brand'])
+            self.assertEqual(queries, 0)
+
+            self.brand.name = 'Renamed'
+            self.brand.save()
+            response, queries = self.post({'query': self.BRANDS_QUERY})
+            self.assertEqual(self.get_brand_names(response), ['Renamed'])
+            self.assertGreater(queries, 0)
+
+    def test_authenticated_and_other_results_are_not_cached(self):
+        users_query = '{ users(first: 10) { edges { node { username } } } }'
+        with self.settings(GRAPHQL_CACHE={'CACHE_RESULTS': True}):
+            for _ in range(2):
+                _, queries = self.post({'query': users_query})
+                self.assertGreater(queries, 0)
+
+            self.client.force_login(get_user_model().objects.create_user(username='user', password='password'))
+            self.post({'query': self.BRANDS_QUERY})
+            # Bypasses the signals, a cached result would still be served
+            Brand.objects.update(name='Renamed')
+            response, _ = self.post({'query': self.BRANDS_QUERY})
+            self.assertEqual(self.get_brand_names(response), ['Renamed'])
@@ -0,0 +1,130 @@
+from datetime import timedelta
+from io import StringIO
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop import idempotency
+from shop.models import Product, Brand, Category, Cart, CartItem, Order, IdempotencyKey
+from shoppy.query_budget import QueryCounter
+
+User = get_user_model()
+
+
+def sample_product(**params):
+    defaults = {
+        'title': 'Sample product',
+        'price': Money(10, 'USD'),
+        'brand': Brand.objects.create(name='Sample brand'),
+        'category': Category.objects.create(name='Sample category'),
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+class IdempotencyTestCase(TestCase):
+
+    def setUp(self):
+        idempotency.memory.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create()
+        self.product = sample_product()
+        self.items_url = reverse('shop:cartitems-list', args=[self.cart.id])
+
+    def add(self, key, quantity=1):
+        payload = {'product_id': self.product.id, 'quantity': quantity}
+        return self.client.post(self.items_url, payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retries_replay_the_stored_response(self):
+        first = self.add('key1')
+        idempotency.memory.clear()
+        second = self.add('key1')
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            third = self.add('key1')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((second.status_code, second.content), (first.status_code, first.content))
+        self.assertEqual(third['Idempotent-Replayed'], 'true')
+        self.assertEqual(counter.count, 0)
+        self.assertEqual(CartItem.objects.get(cart=self.cart).quantity, 1)
+
+    def test_different_keys_are_different_requests(self):
+        self.add('key1')
+        self.add('key2')
+
+        self.assertEqual(CartItem.objects.get(cart=self.cart).quantity, 2)
+
+    def test_reusing_a_key_with_another_body_returns_422(self):
+        self.add('key1')
+
+        response = self.add('key1', quantity=2)
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_a_key_still_in_progress_returns_409(self):
+        self.add('key1')
+        IdempotencyKey.objects.update(status_code=None)
+        idempotency.memory.clear()
+
+        response = self.add('key1')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_a_key_left_unfinished_past_its_lease_can_be_retried(self):
+        self.add('key1')
+        # The worker handling the first request died before storing its response
+        IdempotencyKey.objects.update(status_code=None, created_at=timezone.now() - timedelta(minutes=2))
+        idempotency.memory.clear()
+
+        response = self.add('key1')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(CartItem.objects.get(cart=self.cart).quantity, 2)
+
+    def test_a_request_outliving_its_lease_leaves_the_retry_outcome_alone(self):
+        slow, retry = uuid4(), uuid4()
+        self.assertIsNone(idempotency.claim('key1', 'body', slow))
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        self.assertIsNone(idempotency.claim('key1', 'body', retry))
+
+        idempotency.store('key1', 'body', retry, HttpResponse(b'retry', status=201))
+        idempotency.store('key1', 'body', slow, HttpResponse(b'slow', status=201))
+        idempotency.release('key1', slow)
+
+        stored = IdempotencyKey.objects.get()
+        self.assertEqual((stored.token, bytes(stored.content)), (retry, b'retry'))
+        self.assertEqual(idempotency.memory.get('key1')['content'], b'retry')
+
+    def test_retried_checkout_does_not_create_another_order(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=1)
+        url = reverse('shop:orders-list')
+
+        first = self.client.post(url, {'cart_id': str(self.cart.id)}, HTTP_IDEMPOTENCY_KEY='order1')
+        second = self.client.post(url, {'cart_id': str(self.cart.id)}, HTTP_IDEMPOTENCY_KEY='order1')
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_keys_are_purged(self):
+        self.add('key1')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+
+        self.assertIn('Deleted 1 expired idempotency keys', out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
@@ -0,0 +1,119 @@
+import os
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from djmoney.money import Money
+from PIL import Image
+from rest_framework.test import APIClient
+
+from shop.images import generate_variants, get_formats, get_variant_name, has_variants
+from shop.models import Product, Brand, Category
+
+
+def sample_image(name='photo.png', size=(2000, 1000), mode='RGB', color='red', image_format='PNG'):
+    buffer = BytesIO()
+    Image.new(mode, size, color).save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+
+class ImageVariantsTestCase(TestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name, SHOP_IMAGES={'WORKERS': 0})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.brand = Brand.objects.create(name='Brand1')
+        self.category = Category.objects.create(name='Category1')
+
+    def sample_product(self, **params):
+        return Product.objects.create(
+            title='Product1', price=Money(10, 'USD'), brand=self.brand, category=self.category, **params
+        )
+
+    def test_variants_are_generated_once_the_upload_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.sample_product(image=sample_image())
+
+        self.assertTrue(has_variants(product.image.name))
+        with default_storage.open(get_variant_name(product.image.name, 'card', 'jpeg')) as file:
+            self.assertEqual(Image.open(file).size, (480, 240))
+
+    def test_variants_are_only_scheduled_for_new_images(self):
+        with patch('shop.images.schedule_variants') as schedule_variants:
+            with self.captureOnCommitCallbacks(execute=True):
+                product = self.sample_product(image=sample_image())
+            self.assertEqual(schedule_variants.call_count, 1)
+
+            product = Product.objects.get(pk=product.pk)
+            with self.captureOnCommitCallbacks(execute=True), patch('shop.images.has_variants') as has_variants_mock:
+                product.title = 'Renamed'
+                product.save()
+            self.assertEqual(schedule_variants.call_count, 1)
+            has_variants_mock.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                product.image = sample_image('other.png')
+                product.save()
+            self.assertEqual(schedule_variants.call_count, 2)
+
+    def test_transparent_images_are_flattened_onto_white_for_jpeg(self):
+        product = self.sample_product(image=sample_image(mode='RGBA', color=(0, 0, 0, 0)))
+
+        generate_variants(product.image.name)
+
+        with default_storage.open(get_variant_name(product.image.name, 'thumbnail', 'jpeg')) as file:
+            self.assertEqual(Image.open(file).convert('RGB').getpixel((0, 0)), (255, 255, 255))
+
+    def test_originals_differing_by_extension_have_their_own_variants(self):
+        png = self.sample_product(image=sample_image('photo.png'))
+        jpeg = self.sample_product(image=sample_image('photo.jpg', image_format='JPEG'))
+
+        self.assertTrue(generate_variants(png.image.name))
+        self.assertTrue(generate_variants(jpeg.image.name))
+        self.assertNotEqual(
+            get_variant_name(png.image.name, 'card', 'jpeg'), get_variant_name(jpeg.image.name, 'card', 'jpeg'),
+        )
+
+    def test_existing_variants_are_kept(self):
+        product = self.sample_product(image=sample_image())
+
+        self.assertTrue(generate_variants(product.image.name))
+        self.assertFalse(generate_variants(product.image.name))
+        self.assertTrue(generate_variants(product.image.name, force=True))
+
+    def test_serializer_exposes_the_variant_urls(self):
+        product = self.sample_product(image=sample_image())
+        self.sample_product()
+        client = APIClient()
+
+        response = client.get(reverse('shop:products-list'))
+
+        images = {result['id']: result['images'] for result in response.data['results']}
+        self.assertIsNone([value for pk, value in images.items() if pk != product.id][0])
+        self.assertEqual(images[product.id]['original'], product.image.url)
+        self.assertEqual(set(images[product.id]['thumbnail']), set(get_formats()))
+        self.assertTrue(images[product.id]['zoom']['jpeg'].endswith('-zoom.jpg'))
+
+    def test_backfill_command(self):
+        products = [self.sample_product(image=sample_image(f'photo{i}.png')) for i in range(3)]
+        Product.objects.create(
+            title='Broken', price=Money(1, 'USD'), brand=self.brand, category=self.category,
+            image=SimpleUploadedFile('broken.png', b'not an image'),
+        )
+        out = StringIO()
+
+        with self.assertLogs('shop.images', 'ERROR'):
+            call_command('generate_image_variants', '--workers', '2', stdout=out)
+
+        self.assertIn('Generated the variants of 3 images, 0 were up to date and 1 failed', out.getvalue())
+        self.assertTrue(all(has_variants(product.image.name) for product in products))
+        self.assertTrue(os.path.isdir(os.path.join(default_storage.location, 'products', 'variants')))
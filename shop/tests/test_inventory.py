@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.inventory import set_stock, reserve_stock, OutOfStock
+from shop.models import Product, Brand, Category, Cart, CartItem, Order, Stock
+
+User = get_user_model()
+
+
+def sample_product(**params):
+    defaults = {
+        'title': 'Sample product',
+        'price': Money(10, 'USD'),
+        'brand': Brand.objects.create(name='Sample brand'),
+        'category': Category.objects.create(name='Sample category'),
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+def available(product):
+    return Stock.objects.filter(product=product).aggregate(total=Sum('available'))['total']
+
+
+class ReserveStockTestCase(TestCase):
+
+    def test_set_stock_spreads_units_over_shards(self):
+        product = sample_product()
+
+        set_stock(product, 10, shards=4)
+
+        self.assertEqual(list(product.stock.order_by('shard').values_list('available', flat=True)), [3, 3, 2, 2])
+
+    def test_reservation_takes_units_from_several_shards(self):
+        product1 = sample_product()
+        product2 = sample_product()
+        set_stock(product1, 10, shards=4)
+        set_stock(product2, 1)
+
+        reserve_stock({product1.id: 7, product2.id: 1})
+
+        self.assertEqual(available(product1), 3)
+        self.assertEqual(available(product2), 0)
+
+    def test_reservation_is_all_or_nothing(self):
+        product1 = sample_product()
+        product2 = sample_product()
+        set_stock(product1, 5, shards=2)
+        set_stock(product2, 1)
+
+        with self.assertRaises(OutOfStock) as context:
+            reserve_stock({product1.id: 2, product2.id: 2})
+
+        self.assertEqual(context.exception.product_ids, [product2.id])
+        self.assertEqual(available(product1), 5)
+        self.assertEqual(available(product2), 1)
+
+    def test_untracked_products_are_not_limited(self):
+        product = sample_product()
+
+        reserve_stock({product.id: 1000})
+
+        self.assertFalse(Stock.objects.exists())
+
+
+class CheckoutStockTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, product, quantity):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return self.client.post(reverse('shop:orders-list'), {'cart_id': str(cart.id)})
+
+    def test_checkout_reserves_stock(self):
+        product = sample_product()
+        set_stock(product, 3)
+
+        response = self.checkout(product, 2)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(available(product), 1)
+
+    def test_checkout_without_enough_stock_returns_400(self):
+        product = sample_product()
+        set_stock(product, 1)
+
+        response = self.checkout(product, 2)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Not enough stock', str(response.data['cart_id']))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(available(product), 1)
+
+
+class ConcurrentReservationTestCase(TransactionTestCase):
+
+    def test_concurrent_reservations_never_oversell(self):
+        product = sample_product()
+        set_stock(product, 20, shards=4)
+
+        def reserve(_):
+            try:
+                with transaction.atomic():
+                    reserve_stock({product.id: 3})
+                return True
+            except OutOfStock:
+                return False
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(reserve, range(10)))
+
+        self.assertEqual(results.count(True), 6)
+        self.assertEqual(available(product), 2)
@@ -0,0 +1,95 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.models import Product, Brand, Category, Cart, CartItem, Order
+from shop.views import OrderViewSet
+from shoppy.query_budget import QueryBudgetTestMixin
+
+User = get_user_model()
+
+
+def sample_product(**params):
+    defaults = {
+        'title': 'Sample product',
+        'price': Money(10, 'USD'),
+        'brand': Brand.objects.create(name='Sample brand'),
+        'category': Category.objects.create(name='Sample category'),
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+class OrderHistoryTestCase(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user1', password='pass123456')
+        self.client.force_authenticate(self.user)
+        self.product = sample_product()
+
+    def place_order(self, quantity=1):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.product, quantity=quantity)
+        response = self.client.post(reverse('shop:orders-list'), {'cart_id': str(cart.id)})
+        return Order.objects.get(pk=response.data['id'])
+
+    def test_checkout_stores_the_order_total(self):
+        order = self.place_order(quantity=3)
+
+        self.assertEqual(order.total_price, Money(30, 'USD'))
+
+    def test_list_is_a_paginated_summary_newest_first(self):
+        orders = [self.place_order() for _ in range(12)]
+        Order.objects.create(user=User.objects.create_user(username='user2', password='pass123456'))
+
+        with self.assertWithinQueryBudget(OrderViewSet, 'list'):
+            first = self.client.get(reverse('shop:orders-list'))
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual([order['id'] for order in first.data['results'] + second.data['results']], [
+            order.id for order in reversed(orders)
+        ])
+        self.assertNotIn('items', first.data['results'][0])
+        self.assertEqual(first.data['results'][0]['price_currency'], 'USD')
+        self.assertEqual(Decimal(first.data['results'][0]['total_price']), Decimal(10))
+        self.assertIsNone(second.data['next'])
+
+    def test_totals_use_the_price_paid_not_the_current_price(self):
+        order = self.place_order(quantity=2)
+        self.product.price = Money(99, 'USD')
+        self.product.save()
+
+        with self.assertWithinQueryBudget(OrderViewSet, 'retrieve'):
+            response = self.client.get(reverse('shop:orders-detail', args=[order.id]))
+
+        self.assertEqual(Decimal(response.data['total_price']), Decimal(20))
+        self.assertEqual(Decimal(response.data['items'][0]['total_price']), Decimal(20))
+
+    def test_orders_keep_the_product_as_it_was_ordered(self):
+        order = self.place_order(quantity=2)
+        self.product.title = 'Renamed product'
+        self.product.price = Money(99, 'USD')
+        self.product.save()
+
+        response = self.client.get(reverse('shop:orders-detail', args=[order.id]))
+
+        self.assertEqual(response.data['item_count'], 2)
+        self.assertEqual(response.data['items'][0]['product'], {
+            'id': self.product.id, 'title': 'Sample product', 'price': Decimal(10),
+        })
+
+    def test_order_admin_lists_orders(self):
+        self.place_order()
+        admin = User.objects.create_superuser('admin', password='pass123456')
+        self.client.force_login(admin)
+
+        response = self.client.get(reverse('admin:shop_order_changelist'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
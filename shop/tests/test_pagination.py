@@ -0,0 +1,99 @@
+from base64 import urlsafe_b64encode
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.models import Product, Brand, Category
+from shoppy.query_budget import QueryCounter
+
+User = get_user_model()
+
+
+def sample_products(prices):
+    brand = Brand.objects.create(name='Sample brand')
+    category = Category.objects.create(name='Sample category')
+    return [
+        Product.objects.create(
+            title=f'Product{i}',
+            price=Money(price, 'USD'),
+            brand=brand,
+            category=category,
+        ) for i, price in enumerate(prices)
+    ]
+
+
+class KeysetPaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [product['id'] for product in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_walking_cursors_returns_every_product_once_in_default_order(self):
+        products = sample_products([1] * 25)
+
+        ids = self.collect(reverse('shop:products-list') + '?pagination=cursor')
+
+        self.assertEqual(ids, sorted([product.id for product in products], reverse=True))
+
+    def test_walking_cursors_by_price_breaks_ties_by_id(self):
+        products = sample_products([3, 1, 2, 1, 3, 2, 1, 2, 3, 1, 2, 3] * 2)
+
+        ids = self.collect(reverse('shop:products-list') + '?pagination=cursor&ordering=price')
+
+        expected = sorted(products, key=lambda product: (product.price.amount, product.id))
+        self.assertEqual(ids, [product.id for product in expected])
+
+    def test_previous_cursor_returns_the_previous_page(self):
+        sample_products(range(1, 26))
+        url = reverse('shop:products-list') + '?pagination=cursor&ordering=-price'
+
+        first = self.client.get(url).data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+
+        self.assertIsNone(first['previous'])
+        self.assertEqual(back['results'], first['results'])
+
+    def test_cursor_mode_does_not_count_rows(self):
+        sample_products([1] * 5)
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.client.get(reverse('shop:products-list') + '?pagination=cursor')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertFalse(any('COUNT(' in sql for sql in counter.queries))
+
+    def test_approximate_count_is_estimated_by_the_planner(self):
+        sample_products([1] * 5)
+
+        response = self.client.get(reverse('shop:products-list') + '?pagination=cursor&count=approximate')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.data['count'], int)
+
+    def test_if_cursor_is_invalid_returns_404(self):
+        response = self.client.get(reverse('shop:products-list') + '?cursor=wrong')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_if_cursor_holds_non_finite_numbers_returns_404(self):
+        for payload in ['{"p": [1e400], "r": 0}', '{"p": [Infinity], "r": 0}', '{"p": [NaN], "r": 1}']:
+            cursor = urlsafe_b64encode(payload.encode()).decode()
+            response = self.client.get(reverse('shop:products-list') + f'?cursor={cursor}')
+
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,96 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.models import Product, Brand, Category, Cart, CartItem, Order, OrderItem
+from shop.views import ProductViewSet, CartViewSet, OrderViewSet, BrandViewSet
+from shoppy.query_budget import QueryBudgetTestMixin, QueryBudgetExceeded
+
+User = get_user_model()
+
+
+def sample_products(count):
+    return [
+        Product.objects.create(
+            title=f'Product{i}',
+            price=Money(i + 1, 'USD'),
+            brand=Brand.objects.create(name=f'Brand{i}'),
+            category=Category.objects.create(name=f'Category{i}'),
+        ) for i in range(count)
+    ]
+
+
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='pass123456',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_of_products_stays_within_budget(self):
+        sample_products(10)
+
+        with self.assertWithinQueryBudget(ProductViewSet, 'list'):
+            response = self.client.get(reverse('shop:products-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_list_of_brands_stays_within_budget(self):
+        sample_products(5)
+
+        with self.assertWithinQueryBudget(BrandViewSet, 'list'):
+            response = self.client.get(reverse('shop:brands-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_cart_stays_within_budget(self):
+        cart = Cart.objects.create()
+        for product in sample_products(5):
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+
+        with self.assertWithinQueryBudget(CartViewSet, 'retrieve'):
+            response = self.client.get(reverse('shop:carts-detail', args=[cart.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['items']), 5)
+
+    def test_list_of_orders_stays_within_budget(self):
+        products = sample_products(5)
+        for _ in range(3):
+            order = Order.objects.create(user=self.user)
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=product.price)
+
+        with self.assertWithinQueryBudget(OrderViewSet, 'list'):
+            response = self.client.get(reverse('shop:orders-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_exceeding_the_budget_raises_in_strict_mode(self):
+        sample_products(2)
+
+        with mock.patch.object(ProductViewSet, 'query_budget', {'list': 1}), \
+                self.settings(QUERY_BUDGET_STRICT=True):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('shop:products-list'))
+
+    def test_exceeding_the_budget_logs_when_not_strict(self):
+        sample_products(2)
+
+        with mock.patch.object(ProductViewSet, 'query_budget', {'list': 1}), \
+                self.settings(QUERY_BUDGET_STRICT=False):
+            with self.assertLogs('shoppy.query_budget', level='WARNING'):
+                response = self.client.get(reverse('shop:products-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
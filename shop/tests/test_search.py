@@ -0,0 +1,74 @@
+from django.test import TestCase
+from django.urls import reverse
+from djmoney.money import Money
+from graphene.test import Client as GraphQLClient
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.models import Product, Brand, Category
+from shop.search import search_products
+from shoppy.schema import schema
+
+
+def sample_product(**params):
+    defaults = {
+        'title': 'Sample product',
+        'description': '',
+        'price': Money(1, 'USD'),
+        'brand': Brand.objects.get_or_create(name='Sample brand')[0],
+        'category': Category.objects.get_or_create(name='Sample category')[0],
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+class SearchTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_search_matches_prefixes_of_every_term(self):
+        sample_product(title='Blue cotton shirt')
+        sample_product(title='Blueberry jam')
+        sample_product(title='Red shirt')
+
+        response = self.client.get(reverse('shop:products-list') + '?search=blu sh')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['title'] for product in response.data['results']], ['Blue cotton shirt'])
+
+    def test_title_matches_rank_above_description_matches(self):
+        in_description = sample_product(title='Jacket', description='A leather jacket, comes with a belt')
+        in_title = sample_product(title='Leather belt')
+
+        results = list(search_products(Product.objects.all(), 'belt'))
+
+        self.assertEqual(results, [in_title, in_description])
+
+    def test_search_vector_is_kept_current_on_updates_and_bulk_inserts(self):
+        product = sample_product(title='Old title')
+        Product.objects.filter(pk=product.pk).update(title='Renamed product')
+        Product.objects.bulk_create([
+            Product(title='Imported product', price=Money(1, 'USD'), brand=product.brand, category=product.category)
+        ])
+
+        self.assertFalse(search_products(Product.objects.all(), 'old').exists())
+        self.assertEqual(search_products(Product.objects.all(), 'renamed').get(), product)
+        self.assertTrue(search_products(Product.objects.all(), 'imported').exists())
+
+    def test_search_without_terms_returns_everything(self):
+        sample_product()
+        sample_product()
+
+        response = self.client.get(reverse('shop:products-list') + '?search=%20-')
+
+        self.assertEqual(response.data['count'], 2)
+
+    def test_graphql_products_can_be_searched(self):
+        sample_product(title='Blue shirt')
+        sample_product(title='Red shirt')
+
+        result = GraphQLClient(schema).execute('{ products(search: "blue") { edges { node { title } } } }')
+
+        self.assertNotIn('errors', result)
+        self.assertEqual(result['data']['products']['edges'], [{'node': {'title': 'Blue shirt'}}])
@@ -0,0 +1,63 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from djmoney.money import Money
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop import suggest
+from shop.models import Product, Brand, Category
+
+
+class SuggestTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        suggest.cache.clear()
+
+        brand = Brand.objects.create(name='Shirtmakers')
+        category = Category.objects.create(name='Shirts')
+        Brand.objects.create(name='Shoemakers')
+        for title in ['Blue shirt', 'Red shirt', 'Jeans']:
+            Product.objects.create(title=title, price=Money(1, 'USD'), brand=brand, category=category)
+
+    def test_suggestions_cover_products_brands_and_categories(self):
+        response = self.client.get(reverse('shop:suggest') + '?q=shirt')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(response.data['products']), ['Blue shirt', 'Red shirt'])
+        self.assertEqual(response.data['brands'], ['Shirtmakers'])
+        self.assertEqual(response.data['categories'], ['Shirts'])
+
+    def test_suggestions_are_limited(self):
+        response = self.client.get(reverse('shop:suggest') + '?q=shirt&limit=1')
+
+        self.assertEqual(len(response.data['products']), 1)
+
+    def test_short_queries_return_no_suggestions(self):
+        response = self.client.get(reverse('shop:suggest') + '?q=s')
+
+        self.assertEqual(response.data, {'products': [], 'brands': [], 'categories': []})
+
+    def test_hot_prefixes_are_served_from_memory_until_the_catalog_changes(self):
+        with CaptureQueriesContext(connection) as context:
+            suggest.suggest('jea')
+            suggest.suggest('jea')
+        self.assertEqual(len(context.captured_queries), 1)
+
+        Category.objects.create(name='Jeans')
+
+        self.assertEqual(suggest.suggest('jea')['categories'], ['Jeans'])
+
+    def test_suggestions_are_served_by_trigram_indexes(self):
+        with connection.cursor() as cursor:
+            # The tables are tiny, make the planner pick the indexes whenever it can
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = suggest.get_suggestions_queryset('shirt', 5).explain()
+
+        for index in ['shop_product_title_trgm_idx', 'shop_brand_name_trgm_idx', 'shop_category_name_trgm_idx']:
+            self.assertIn(f'Bitmap Index Scan on {index}', plan)
+
+    def test_like_wildcards_are_matched_literally(self):
+        self.assertEqual(suggest.suggest('s%t')['products'], [])
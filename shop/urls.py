@@ -1,7 +1,10 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedDefaultRouter
 
-from .views import BrandViewSet, CategoryViewSet, ProductViewSet, CartViewSet, CartItemViewSet, OrderViewSet
+from .views import (
+    BrandViewSet, CategoryViewSet, ProductViewSet, CartViewSet, CartItemViewSet, OrderViewSet, SuggestView
+)
 
 app_name = 'shop'
 
@@ -15,4 +18,6 @@ router.register('orders', OrderViewSet, basename='orders')
 carts_router = NestedDefaultRouter(router, 'carts', lookup='cart')
 carts_router.register('items', CartItemViewSet, basename='cartitems')
 
-urlpatterns = router.urls + carts_router.urls
+urlpatterns = [
+    path('suggest/', SuggestView.as_view(), name='suggest'),
+] + router.urls + carts_router.urls
@@ -1,50 +1,75 @@
-from django.contrib.auth import get_user_model
+import re
+from io import TextIOWrapper
+
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.db.models import Count, Max, Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.mixins import DestroyModelMixin, RetrieveModelMixin, CreateModelMixin
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 
-from .filters import ProductFilterSet
-from .models import Product, Brand, Category, CartItem, Cart, Order
-from .pagination import DefaultPagination
+from .catalog import (
+    CONTENT_TYPES, guess_format, read_rows, import_products, export_products, encode_lines, gzip_chunks
+)
+from .cart_store import get_cart_store, CartItemNotFound
+from .carts import apply_cart_change, bulk_change_cart_items, line_total, CartNotFound, QuantityTooLarge, MAX_QUANTITY
+from .caching import CachedResponseMixin, ConditionalGetMixin
+from .checkout import order_line_total
+from .filters import ProductFilterSet, ProductSearchFilter
+from .idempotency import IdempotencyMixin
+from .models import Product, Brand, Category, CartItem, Cart, Order, OrderItem
+from .pagination import CatalogPagination, KeysetPagination
 from .permissions import IsAdminOrReadOnly
 from .serializers import (
     CategorySerializer, ProductSerializer, BrandSerializer, CartItemSerializer,
     UpdateCartItemSerializer, AddCartItemSerializer, CartSerializer, CreateOrderSerializer, OrderSerializer,
-    UpdateOrderSerializer, CreateProductSerializer, UpdateProductSerializer
+    UpdateOrderSerializer, CreateProductSerializer, UpdateProductSerializer, BulkCartItemsSerializer,
+    OrderSummarySerializer, ProductExportQuerySerializer
 )
+from .suggest import suggest, DEFAULT_LIMIT, MAX_LIMIT
 
-User = get_user_model()
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
 
 
-class BrandViewSet(ModelViewSet):
+class BrandViewSet(CachedResponseMixin, ModelViewSet):
     queryset = Brand.objects.all()
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
     serializer_class = BrandSerializer
+    cache_dependencies = (Brand,)
+    query_budget = {'list': 2, 'retrieve': 2}
 
     class Meta:
         model = Brand
 
 
-class CategoryViewSet(ModelViewSet):
+class CategoryViewSet(CachedResponseMixin, ModelViewSet):
     queryset = Category.objects.all()
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
     serializer_class = CategorySerializer
+    cache_dependencies = (Category,)
+    query_budget = {'list': 2, 'retrieve': 2}
 
     class Meta:
         model = Category
 
 
-class ProductViewSet(ModelViewSet):
-    queryset = Product.objects.all()
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+class ProductViewSet(CachedResponseMixin, ModelViewSet):
+    queryset = Product.objects.select_related('brand', 'category').all()
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
     filterset_class = ProductFilterSet
     permission_classes = [IsAdminOrReadOnly]
-    pagination_class = DefaultPagination
-    search_fields = ['title', 'description']
+    pagination_class = CatalogPagination
     ordering_fields = ['price']
+    cache_dependencies = (Product, Brand, Category)
+    query_budget = {'list': 3, 'retrieve': 2, 'export': 1}
 
     class Meta:
         model = Product
@@ -56,22 +81,117 @@ class ProductViewSet(ModelViewSet):
             return UpdateProductSerializer
         return ProductSerializer
 
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser])
+    def import_products(self, request):
+        """
+        Create or update products from an uploaded ``file`` in CSV or JSON Lines (by its extension), see
+        `shop.catalog.import_products`. Invalid rows are reported in ``errors`` and the others imported anyway.
+        """
+        file = request.FILES.get('file')
+        if file is None:
+            raise ValidationError({'file': ['No file was submitted.']})
+        file_format = guess_format(file.name)
+        if file_format is None:
+            raise ValidationError({'file': ['Expected a .csv or .jsonl file.']})
+
+        result = import_products(read_rows(TextIOWrapper(file, encoding='utf-8-sig'), file_format))
+        return Response(result)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def export(self, request):
+        """
+        Stream the whole catalog (``?output=jsonl`` or ``csv``), or the products modified since ``?since=``,
+        in a single query. Compressed on the fly for clients accepting gzip.
+        """
+        serializer = ProductExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        file_format = serializer.validated_data['output']
+
+        chunks = encode_lines(export_products(file_format, since=serializer.validated_data.get('since')))
+        gzipped = bool(ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+        if gzipped:
+            chunks = gzip_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[file_format])
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        return response
+
+
+class SuggestView(APIView):
+    """
+    Typeahead suggestions: product titles, brand and category names containing `q`
+    """
+    permission_classes = [IsAdminOrReadOnly]
+    http_method_names = ['get', 'head', 'options']
+    query_budget = {'get': 2}
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        return Response(suggest(request.query_params.get('q', ''), max(limit, 1)))
+
 
 class CartViewSet(
+    ConditionalGetMixin,
     CreateModelMixin,
     RetrieveModelMixin,
     DestroyModelMixin,
     GenericViewSet
 ):
-    queryset = Cart.objects.prefetch_related('items__product').all()
+    queryset = Cart.objects.prefetch_related(
+        Prefetch('items', queryset=CartItem.objects.select_related('product').annotate(total_price=line_total()))
+    ).all()
     serializer_class = CartSerializer
+    query_budget = {'retrieve': 3}
+
+    def get_conditional_aggregates(self):
+        return {
+            **super().get_conditional_aggregates(),
+            'item_count': Count('items', distinct=True),
+            'products_updated_at': Max('items__product__updated_at'),
+        }
+
+    # Carts kept in a cart store rather than in the database, see `shop.cart_store`
+
+    def create(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().create(request, *args, **kwargs)
+        return Response(CartSerializer(store.create()).data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            return Response(CartSerializer(store.get(kwargs['pk'])).data)
+        except CartNotFound:
+            raise NotFound('No cart with the given ID was found.')
 
+    def destroy(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().destroy(request, *args, **kwargs)
+        try:
+            store.delete(kwargs['pk'])
+        except CartNotFound:
+            raise NotFound('No cart with the given ID was found.')
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-class CartItemViewSet(ModelViewSet):
+
+class CartItemViewSet(IdempotencyMixin, ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
+    query_budget = {'list': 2, 'retrieve': 2, 'create': 3, 'bulk': 9}
+    idempotent_actions = ('create', 'bulk')
 
     def get_serializer_class(self):
-        if self.request.method == 'POST':
+        if self.action == 'bulk':
+            return BulkCartItemsSerializer
+        elif self.request.method == 'POST':
             return AddCartItemSerializer
         elif self.request.method == 'PATCH':
             return UpdateCartItemSerializer
@@ -81,11 +201,102 @@ class CartItemViewSet(ModelViewSet):
         return {'cart_id': self.kwargs['cart_pk']}
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('product')
+        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('product').annotate(
+            total_price=line_total()
+        )
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # Lock the item so concurrent updates apply their changes to the cart totals one after the other
+        item = serializer.instance
+        quantity = CartItem.objects.select_for_update().values_list('quantity', flat=True).get(pk=item.pk)
+        super().perform_update(serializer)
+        apply_cart_change(self.kwargs['cart_pk'], item.product_id, item.quantity - quantity)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        quantity = CartItem.objects.select_for_update().values_list('quantity', flat=True).get(pk=instance.pk)
+        super().perform_destroy(instance)
+        apply_cart_change(self.kwargs['cart_pk'], instance.product_id, -quantity)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, cart_pk=None):
+        """Add, set or remove many items at once: ``{"operation": "add", "items": [{"product_id", "quantity"}]}``"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = [(item['product_id'], item.get('quantity', 0)) for item in serializer.validated_data['items']]
+        store = get_cart_store()
+        try:
+            if store is None:
+                bulk_change_cart_items(cart_pk, serializer.validated_data['operation'], items)
+                return Response(CartItemSerializer(self.get_queryset(), many=True).data)
+            store.change_items(cart_pk, serializer.validated_data['operation'], items)
+            return Response(CartItemSerializer(store.get(cart_pk).items.all(), many=True).data)
+        except CartNotFound:
+            raise NotFound('No cart with the given ID was found.')
+        except QuantityTooLarge:
+            raise ValidationError({'items': [f'A cart holds at most {MAX_QUANTITY} units of a product.']})
+
+    # Carts kept in a cart store rather than in the database, see `shop.cart_store`
 
+    def get_stored_cart(self, store):
+        try:
+            return store.get(self.kwargs['cart_pk'])
+        except CartNotFound:
+            raise NotFound('No cart with the given ID was found.')
 
-class OrderViewSet(ModelViewSet):
+    def get_stored_item_id(self):
+        try:
+            return int(self.kwargs['pk'])
+        except ValueError:
+            raise NotFound()
+
+    def list(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().list(request, *args, **kwargs)
+        return Response(CartItemSerializer(self.get_stored_cart(store).items.all(), many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().retrieve(request, *args, **kwargs)
+        item_id = self.get_stored_item_id()
+        for item in self.get_stored_cart(store).items.all():
+            if item.id == item_id:
+                return Response(CartItemSerializer(item).data)
+        raise NotFound()
+
+    def partial_update(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().partial_update(request, *args, **kwargs)
+        serializer = UpdateCartItemSerializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        item_id = self.get_stored_item_id()
+        try:
+            if 'quantity' in serializer.validated_data:
+                store.update_item(self.kwargs['cart_pk'], item_id, serializer.validated_data['quantity'])
+            item = next(item for item in self.get_stored_cart(store).items.all() if item.id == item_id)
+        except (CartNotFound, CartItemNotFound, StopIteration):
+            raise NotFound()
+        return Response(UpdateCartItemSerializer(item).data)
+
+    def destroy(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().destroy(request, *args, **kwargs)
+        try:
+            store.remove_item(self.kwargs['cart_pk'], self.get_stored_item_id())
+        except (CartNotFound, CartItemNotFound):
+            raise NotFound()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class OrderViewSet(IdempotencyMixin, ConditionalGetMixin, ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+    pagination_class = KeysetPagination
+    query_budget = {'list': 2, 'retrieve': 3, 'create': 10}
 
     def get_permissions(self):
         if self.request.method in ['PATCH', 'DELETE']:
@@ -97,16 +308,23 @@ class OrderViewSet(ModelViewSet):
             return CreateOrderSerializer
         elif self.request.method == 'PATCH':
             return UpdateOrderSerializer
+        elif self.action == 'list':
+            return OrderSummarySerializer
         return OrderSerializer
 
     def get_queryset(self):
         user = self.request.user
 
+        queryset = Order.objects.all()
+        if self.action != 'list':
+            queryset = queryset.prefetch_related(
+                Prefetch('items', queryset=OrderItem.objects.annotate(total_price=order_line_total()))
+            )
+
         if user.is_staff:
-            return Order.objects.all()
+            return queryset
 
-        user_id = User.objects.only('id').get(pk=user.id)
-        return Order.objects.filter(user_id=user_id)
+        return queryset.filter(user=user)
 
     def create(self, request, *args, **kwargs):
         serializer = CreateOrderSerializer(
@@ -0,0 +1,162 @@
+import json
+from functools import lru_cache, partial
+from hashlib import md5, sha256
+
+from django.conf import settings
+from django.http import HttpResponseBadRequest
+from graphene_django.views import GraphQLView, HttpError
+from graphql.backend.core import GraphQLCoreBackend
+from graphql.execution import ExecutionResult, execute
+from graphql.language import ast
+from graphql.validation import validate
+
+from shop import caching
+from shop.models import Brand, Category, Product
+from .lru import LRUCache
+
+DEFAULTS = {
+    # Parsed and validated documents kept in memory by `CachedDocumentBackend`
+    'DOCUMENTS': 512,
+    # Path of a JSON list of the documents clients may send by their SHA-256 hash, and whether other queries
+    # are refused
+    'PERSISTED_QUERIES': None,
+    'PERSISTED_ONLY': False,
+    # Results of anonymous queries of the catalog fields, kept until the catalog changes
+    'CACHE_RESULTS': False,
+    'RESULT_TIMEOUT': 300,
+    'KEY_PREFIX': 'shoppy:graphql',
+}
+
+# Root fields whose results only depend on the catalog, see `shop.signals.catalog_changed`
+CATALOG_FIELDS = frozenset(['brands', 'categories', 'products', '__typename'])
+CATALOG_MODELS = (Product, Brand, Category)
+
+
+def get_graphql_cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'GRAPHQL_CACHE', {})}
+
+
+def get_query_hash(query):
+    return sha256(query.encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def load_persisted_queries(path):
+    with open(path, encoding='utf-8') as file:
+        return {get_query_hash(query): query for query in json.load(file)}
+
+
+def get_persisted_queries():
+    """``{sha256: document}`` of the registered documents"""
+    path = get_graphql_cache_settings()['PERSISTED_QUERIES']
+    return load_persisted_queries(path) if path else {}
+
+
+def get_operation(document_ast, operation_name=None):
+    operations = [
+        definition for definition in document_ast.definitions if isinstance(definition, ast.OperationDefinition)
+    ]
+    for operation in operations:
+        if operation_name is None and len(operations) == 1:
+            return operation
+        if operation.name and operation.name.value == operation_name:
+            return operation
+    return None
+
+
+def is_catalog_query(document_ast, operation_name=None):
+    """Whether the operation is a query selecting catalog fields only, directly rather than through fragments"""
+    operation = get_operation(document_ast, operation_name)
+    return operation is not None and operation.operation == 'query' and all(
+        isinstance(selection, ast.Field) and selection.name.value in CATALOG_FIELDS
+        for selection in operation.selection_set.selections
+    )
+
+
+class CachedDocumentBackend(GraphQLCoreBackend):
+    """
+    Keep the most recently used documents parsed and validated against their schema, so a query sent again is
+    executed right away. Documents failing the validation are kept too, and answer with its errors.
+    """
+
+    def __init__(self, executor=None, maxsize=None):
+        super().__init__(executor)
+        self.documents = LRUCache(maxsize=maxsize or get_graphql_cache_settings()['DOCUMENTS'])
+
+    def document_from_string(self, schema, document_string):
+        if not isinstance(document_string, str):
+            return super().document_from_string(schema, document_string)
+
+        key = (schema, document_string)
+        document = self.documents.get(key)
+        if document is None:
+            # Syntax errors are raised, and answered by the view
+            document = super().document_from_string(schema, document_string)
+            errors = document.validation_errors = validate(schema, document.document_ast)
+            if errors:
+                document.execute = lambda **options: ExecutionResult(errors=errors, invalid=True)
+            else:
+                document.execute = partial(execute, schema, document.document_ast, **self.execute_params)
+            self.documents.set(key, document)
+        return document
+
+
+class CachedGraphQLView(GraphQLView):
+    """
+    A `GraphQLView` serving persisted queries, sent by the SHA-256 hash of their document in the
+    ``extensions.persistedQuery.sha256Hash`` parameter (as Apollo clients do), and caching the results of
+    anonymous catalog queries until a product, brand or category changes
+    """
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+        return self.get_persisted_query(request, data, query), variables, operation_name, id
+
+    @staticmethod
+    def get_persisted_query(request, data, query):
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+        persisted = extensions.get('persistedQuery') if isinstance(extensions, dict) else None
+        query_hash = persisted.get('sha256Hash') if isinstance(persisted, dict) else None
+
+        persisted_queries = get_persisted_queries()
+        if query_hash is not None:
+            if query_hash not in persisted_queries:
+                # Apollo clients recognize this message
+                raise HttpError(HttpResponseBadRequest('PersistedQueryNotFound'))
+            return persisted_queries[query_hash]
+        if query and get_graphql_cache_settings()['PERSISTED_ONLY'] and get_query_hash(query) not in persisted_queries:
+            raise HttpError(HttpResponseBadRequest('Only persisted queries are allowed.'))
+        return query
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        key = self.get_result_cache_key(request, query, variables, operation_name)
+        if key is None:
+            return super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+
+        result_data = caching.get_cache().get(key)
+        if result_data is not None:
+            return ExecutionResult(data=result_data)
+        result = super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        if result is not None and not result.errors and not result.invalid:
+            caching.get_cache().set(key, result.data, get_graphql_cache_settings()['RESULT_TIMEOUT'])
+        return result
+
+    def get_result_cache_key(self, request, query, variables, operation_name):
+        cache_settings = get_graphql_cache_settings()
+        if not cache_settings['CACHE_RESULTS'] or not query or request.user.is_authenticated:
+            return None
+        try:
+            document = self.get_backend(request).document_from_string(self.schema, query)
+        except Exception:
+            return None
+        if not is_catalog_query(document.document_ast, operation_name):
+            return None
+
+        generations = caching.get_generations(CATALOG_MODELS)
+        raw = json.dumps([query, variables, operation_name, generations], sort_keys=True, default=str)
+        return f'{cache_settings["KEY_PREFIX"]}:{md5(raw.encode()).hexdigest()}'
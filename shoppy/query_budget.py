@@ -0,0 +1,91 @@
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.queries = []
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+def get_query_budget(view_class, action):
+    """Return the maximum number of queries ``action`` of ``view_class`` may issue, or ``None``"""
+    budget = getattr(view_class, 'query_budget', None) or {}
+    return budget.get(action)
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the queries of every request routed to a viewset that declares a ``query_budget``
+    and raise (``QUERY_BUDGET_STRICT``) or log when the budget of the current action is exceeded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connections[DEFAULT_DB_ALIAS].execute_wrapper(counter):
+            response = self.get_response(request)
+
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and counter.count > budget[1]:
+            self.report(request, budget[0], budget[1], counter.count)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        actions = getattr(view_func, 'actions', None)
+        # Viewsets map methods to actions, plain API views declare budgets per method
+        action = actions.get(request.method.lower()) if actions else request.method.lower()
+        limit = get_query_budget(view_class, action)
+        if limit is not None:
+            request.query_budget = (f'{view_class.__name__}.{action}', limit)
+
+    @staticmethod
+    def report(request, name, limit, count):
+        message = f'{name} issued {count} queries, exceeding its budget of {limit} ({request.method} {request.path})'
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class QueryBudgetTestMixin:
+    """
+    Test case mixin asserting that a block stays within the query budget of a viewset action.
+    Queries are counted with an execute wrapper, as ``connection.queries`` is reset when a request starts.
+    """
+
+    @contextmanager
+    def assertWithinQueryBudget(self, view_class, action, using=DEFAULT_DB_ALIAS):
+        limit = get_query_budget(view_class, action)
+        if limit is None:
+            self.fail(f'{view_class.__name__} declares no query budget for {action!r}')
+
+        counter = QueryCounter()
+        with connections[using].execute_wrapper(counter):
+            yield counter
+
+        if counter.count > limit:
+            queries = '\n'.join(counter.queries)
+            self.fail(
+                f'{view_class.__name__}.{action} issued {counter.count} queries, exceeding its budget of {limit}:\n'
+                f'{queries}'
+            )
@@ -0,0 +1,170 @@
+import logging
+from time import perf_counter
+
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
+from graphql.backend.base import GraphQLDocument
+from graphql.execution import ExecutionResult
+from graphql.language import ast
+from graphql.type import GraphQLList, GraphQLNonNull, get_named_type
+
+from .graphql_cache import CachedDocumentBackend, get_operation
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Queries costing more, or nesting fields deeper, are rejected before they are executed
+    'MAX_COST': 10000,
+    'MAX_DEPTH': 10,
+    # Assumed length of the lists without a page size, such as the reverse relations of `fields = '__all__'`
+    'LIST_SIZE': 100,
+}
+
+PAGE_SIZE_ARGUMENTS = ('first', 'last')
+
+
+def get_query_cost_settings():
+    return {**DEFAULTS, **getattr(settings, 'GRAPHQL_QUERY_COST', {})}
+
+
+def is_connection(graphql_type):
+    fields = getattr(graphql_type, 'fields', None) or {}
+    return 'edges' in fields and 'pageInfo' in fields
+
+
+def is_list(graphql_type):
+    while isinstance(graphql_type, GraphQLNonNull):
+        graphql_type = graphql_type.of_type
+    return isinstance(graphql_type, GraphQLList)
+
+
+class QueryCost:
+    """
+    Estimate the cost of an operation from the schema, before it is executed: every resolved field costs 1,
+    and the fields under a list cost as many times as the list has items. Lists are as long as the ``first``
+    or ``last`` argument of their connection (``RELAY_CONNECTION_MAX_LIMIT`` without any), or ``LIST_SIZE``.
+    Introspection fields are free.
+    """
+
+    def __init__(self, schema, document_ast, variables=None, list_size=None):
+        self.schema = schema
+        self.variables = variables or {}
+        self.list_size = list_size or get_query_cost_settings()['LIST_SIZE']
+        self.document_ast = document_ast
+        self.fragments = {
+            definition.name.value: definition for definition in document_ast.definitions
+            if isinstance(definition, ast.FragmentDefinition)
+        }
+
+    def measure(self, operation_name=None):
+        """``(cost, depth)`` of an operation, ``(0, 0)`` when it is missing and execution will report it"""
+        operation = get_operation(self.document_ast, operation_name)
+        if operation is None:
+            return 0, 0
+        root_type = {
+            'query': self.schema.get_query_type,
+            'mutation': self.schema.get_mutation_type,
+            'subscription': self.schema.get_subscription_type,
+        }[operation.operation]()
+        return self.measure_selections(operation.selection_set, root_type, None, frozenset())
+
+    def measure_selections(self, selection_set, parent_type, page_size, fragments):
+        cost = depth = 0
+        for field, field_type in self.get_fields(selection_set, parent_type, fragments):
+            field_cost, field_depth = self.measure_field(field, field_type, page_size, fragments)
+            cost += field_cost
+            depth = max(depth, field_depth)
+        return cost, depth
+
+    def measure_field(self, field, field_type, page_size, fragments):
+        if field.selection_set is None:
+            return 1, 1
+
+        named_type = get_named_type(field_type)
+        # Pages of a connection are as long as requested, the items of its `edges` list
+        child_page_size = self.get_page_size(field) if is_connection(named_type) else None
+        cost, depth = self.measure_selections(field.selection_set, named_type, child_page_size, fragments)
+        if is_list(field_type):
+            cost *= page_size or self.list_size
+        return 1 + cost, 1 + depth
+
+    def get_fields(self, selection_set, parent_type, fragments):
+        """``(field, type)`` of the fields selected on ``parent_type``, through fragments included"""
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                name = selection.name.value
+                definition = (getattr(parent_type, 'fields', None) or {}).get(name)
+                # Unknown fields are reported by the validation, introspection is not charged
+                if definition is not None and not name.startswith('__'):
+                    yield selection, definition.type
+                continue
+
+            fragment, spread = selection, fragments
+            if isinstance(selection, ast.FragmentSpread):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                # Fragment cycles are invalid, they are reported by the validation as well
+                if fragment is None or name in fragments:
+                    continue
+                spread = fragments | {name}
+            fragment_type = parent_type
+            if fragment.type_condition is not None:
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+            yield from self.get_fields(fragment.selection_set, fragment_type, spread)
+
+    def get_page_size(self, field):
+        max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        for argument in field.arguments:
+            if argument.name.value not in PAGE_SIZE_ARGUMENTS:
+                continue
+            value = argument.value
+            if isinstance(value, ast.Variable):
+                value = self.variables.get(value.name.value)
+            elif isinstance(value, ast.IntValue):
+                value = int(value.value)
+            else:
+                value = None
+            if isinstance(value, int):
+                return min(max(value, 0), max_limit) if max_limit else max(value, 0)
+        return max_limit or self.list_size
+
+
+class QueryCostBackend(CachedDocumentBackend):
+    """
+    Reject the valid operations whose `QueryCost` exceeds ``MAX_COST`` or ``MAX_DEPTH`` before they are executed,
+    and log the cost and duration of the others
+    """
+
+    def document_from_string(self, schema, document_string):
+        document = super().document_from_string(schema, document_string)
+        if getattr(document, 'validation_errors', None):
+            return document
+        execute = document.execute
+
+        def execute_within_budget(variable_values=None, operation_name=None, **options):
+            cost_settings = get_query_cost_settings()
+            query_cost = QueryCost(schema, document.document_ast, variable_values, cost_settings['LIST_SIZE'])
+            cost, depth = query_cost.measure(operation_name)
+            operation = get_operation(document.document_ast, operation_name)
+            name = operation.name.value if operation and operation.name else 'anonymous operation'
+
+            if cost > cost_settings['MAX_COST'] or depth > cost_settings['MAX_DEPTH']:
+                logger.warning('Rejected GraphQL %s: cost %d, depth %d', name, cost, depth)
+                message = (
+                    f'Query cost {cost} exceeds the maximum of {cost_settings["MAX_COST"]}'
+                    if cost > cost_settings['MAX_COST'] else
+                    f'Query depth {depth} exceeds the maximum of {cost_settings["MAX_DEPTH"]}'
+                )
+                return ExecutionResult(errors=[GraphQLError(message)], invalid=True)
+
+            started = perf_counter()
+            result = execute(variable_values=variable_values, operation_name=operation_name, **options)
+            logger.info(
+                'GraphQL %s: cost %d, depth %d, %.1fms', name, cost, depth, (perf_counter() - started) * 1000,
+                extra={'graphql_operation': name, 'graphql_cost': cost, 'graphql_depth': depth},
+            )
+            return result
+
+        # Documents are shared by the requests sending them, see `CachedDocumentBackend`
+        return GraphQLDocument(schema, document.document_string, document.document_ast, execute_within_budget)
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'debug_toolbar',
     'django_extensions',
@@ -43,10 +44,12 @@ INSTALLED_APPS = [
     'djmoney',
     'accounts',
     'shop',
+    'reports',
 ]
 
 MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'shoppy.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -91,6 +94,63 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Rendered catalog responses, invalidated on catalog changes (see `shop.caching`)
+SHOP_RESPONSE_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60 * 5,
+}
+
+# Responses to requests sent with an `Idempotency-Key` header, replayed to retries (see `shop.idempotency`)
+SHOP_IDEMPOTENCY = {
+    'TTL': 60 * 60 * 24,
+    'LEASE': 60,
+    'MEMORY_SIZE': 4096,
+}
+
+# Resized variants of product images, generated in a pool of worker threads (see `shop.images`)
+SHOP_IMAGES = {
+    'WORKERS': 2,
+    'VARIANTS': {
+        'thumbnail': (160, 160),
+        'card': (480, 480),
+        'zoom': (1600, 1600),
+    },
+    'FORMATS': ('webp', 'jpeg'),
+}
+
+# Carts left unchanged for that long are deleted by the `reap_idle_carts` command (see `shop.cart_lifecycle`)
+SHOP_CARTS = {
+    'IDLE_TTL': 60 * 60 * 24 * 30,
+    'REAP_BATCH_SIZE': 1000,
+}
+
+# Where anonymous carts live until checkout: the database when `BACKEND` is unset, or a cart store class such as
+# `shop.cart_store.CacheCartStore` keeping them in the `ALIAS` cache (see `shop.cart_store`)
+SHOP_CART_STORE = {
+    'BACKEND': os.environ.get('CART_STORE_BACKEND') or None,
+    'ALIAS': 'default',
+    'TTL': 60 * 60 * 24 * 30,
+}
+
+# Product feeds written under MEDIA_ROOT by the `generate_product_feed` command (see `shop.feeds`)
+SHOP_FEED = {
+    'DIRECTORY': 'feeds',
+    'SEGMENT_SIZE': 5000,
+    'SITE_URL': os.environ.get('SITE_URL', 'http://localhost:8000'),
+    'PRODUCT_URL': '{site_url}/products/{id}/',
+    'TITLE': 'Shoppy',
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -171,6 +231,28 @@ SPECTACULAR_SETTINGS = {
     'SERVE_PERMISSIONS': ['rest_framework.permissions.IsAdminUser'],
 }
 
+# Raise instead of logging a warning when a viewset action exceeds its declared `query_budget`
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', '').lower() in ('1', 'true', 'yes', 'on')
+
 GRAPHENE = {
     'SCHEMA': 'shoppy.schema.schema'
 }
+
+# GraphQL operations costing more than `MAX_COST` resolved fields, or nested deeper than `MAX_DEPTH`, are rejected
+# before they are executed (see `shoppy.query_cost`)
+GRAPHQL_QUERY_COST = {
+    'MAX_COST': 10000,
+    'MAX_DEPTH': 10,
+    'LIST_SIZE': 100,
+}
+
+# Parsed and validated GraphQL documents kept in memory, documents clients may send by their SHA-256 hash (a JSON
+# list of documents) and results of anonymous catalog queries, cached until the catalog changes
+# (see `shoppy.graphql_cache`)
+GRAPHQL_CACHE = {
+    'DOCUMENTS': 512,
+    'PERSISTED_QUERIES': os.environ.get('GRAPHQL_PERSISTED_QUERIES') or None,
+    'PERSISTED_ONLY': False,
+    'CACHE_RESULTS': True,
+    'RESULT_TIMEOUT': 60 * 5,
+}
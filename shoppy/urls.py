@@ -3,7 +3,9 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
-from graphene_django.views import GraphQLView
+
+from .graphql_cache import CachedGraphQLView
+from .query_cost import QueryCostBackend
 
 admin.site.site_header = 'Shoppy Admin'
 admin.site.index_title = 'Admin'
@@ -11,7 +13,8 @@ admin.site.index_title = 'Admin'
 api_urlpatterns = [
     path('accounts/', include('accounts.urls')),
     path('shop/', include('shop.urls')),
-    path('graphql', GraphQLView.as_view(graphiql=True)),
+    path('reports/', include('reports.urls')),
+    path('graphql', CachedGraphQLView.as_view(graphiql=True, backend=QueryCostBackend())),
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
     path('schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     path('schema/swagger/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),